@@ -0,0 +1,11 @@
+"""Настройки тестов под pytest; manage.py test включает их через
+core.testing.TestRunner."""
+import pytest
+
+from core.testing import testing_settings
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _testing_settings():
+    with testing_settings():
+        yield
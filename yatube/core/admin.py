@@ -0,0 +1,29 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk', 'task', 'status', 'priority', 'attempts', 'run_at',
+        'finished_at',
+    )
+    list_filter = ('status',)
+    search_fields = ('task', 'key')
+    ordering = ('-pk',)
+    show_full_result_count = False
+    readonly_fields = ('locked_by', 'locked_at', 'finished_at', 'created')
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        """Возвращает не удавшиеся задачи в очередь с новыми попытками."""
+        count = queryset.filter(status=Job.FAILED).update(
+            status=Job.QUEUED, attempts=0, run_at=timezone.now(),
+            finished_at=None,
+        )
+        self.message_user(request, f'Задач в очереди: {count}')
+    retry.short_description = 'Повторить'
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,59 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import jobs
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS,
+                thread_name_prefix='background',
+            )
+        return _executor
+
+
+def _call(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s упала', func.__qualname__)
+
+
+def _run(func, args):
+    close_old_connections()
+    try:
+        _call(func, args)
+    finally:
+        close_old_connections()
+
+
+def defer(func, *args, **options):
+    """Выполняет func(*args) в фоне.
+
+    При BACKGROUND_QUEUE задача ставится в очередь core.jobs и
+    выполняется manage.py runworker; options — параметры enqueue.
+    Иначе она уходит в пул потоков процесса после коммита транзакции.
+
+    При BACKGROUND_EAGER задача выполняется сразу, в том же потоке:
+    так её видят тесты, где транзакция не фиксируется. Ошибка задачи и
+    тогда только пишется в лог.
+    """
+    if settings.BACKGROUND_EAGER:
+        _call(func, args)
+        return
+    if settings.BACKGROUND_QUEUE:
+        jobs.enqueue(func, *args, **options)
+        return
+    transaction.on_commit(lambda: executor().submit(_run, func, args))
@@ -0,0 +1,368 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    'CREATE TABLE IF NOT EXISTS cache_stats ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 0),'
+    ' entries INTEGER NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ')',
+    'INSERT OR IGNORE INTO cache_stats VALUES (0, 0, 0)',
+    'CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN'
+    ' UPDATE cache_stats SET entries = entries + 1, size = size + NEW.size;'
+    ' END',
+    'CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN'
+    ' UPDATE cache_stats SET entries = entries - 1, size = size - OLD.size;'
+    ' END',
+    'CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache'
+    ' BEGIN'
+    ' UPDATE cache_stats SET size = size - OLD.size + NEW.size;'
+    ' END',
+)
+
+# Время последнего чтения обновляется не чаще раза в столько секунд,
+# чтобы чтения не превращались в запись.
+ACCESS_RESOLUTION = 10
+BATCH_SIZE = 500
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite, общий для всех процессов на машине.
+
+    LOCATION — путь к файлу. Кроме стандартных MAX_ENTRIES и
+    CULL_FREQUENCY понимает OPTIONS['MAX_SIZE'] — предел суммарного
+    размера значений в байтах. При переполнении сначала удаляются
+    просроченные записи, затем давно не читавшиеся (LRU). Целые числа
+    хранятся как INTEGER, поэтому incr атомарен на уровне SQLite.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._max_size = int(options.get('MAX_SIZE', 0)) or None
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                db.execute(statement)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    @staticmethod
+    def _encode(value):
+        if type(value) is int:
+            return value
+        return sqlite3.Binary(
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        )
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    @staticmethod
+    def _size(value):
+        return 8 if isinstance(value, int) else len(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        mapping = {self._key(key, version): key for key in keys}
+        now = time.time()
+        rows = []
+        names = list(mapping)
+        for start in range(0, len(names), BATCH_SIZE):
+            batch = names[start:start + BATCH_SIZE]
+            rows.extend(self._db.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                f'WHERE key IN ({",".join("?" * len(batch))})',
+                batch,
+            ))
+        found, expired, touched = {}, [], []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                expired.append(key)
+                continue
+            found[mapping[key]] = self._decode(value)
+            if now - accessed > ACCESS_RESOLUTION:
+                touched.append((now, key))
+        if expired:
+            self._delete_expired(expired, now)
+        if touched:
+            self._db.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?', touched
+            )
+        return found
+
+    def _delete_expired(self, keys, now):
+        self._db.executemany(
+            'DELETE FROM cache WHERE key = ? AND expires <= ?',
+            [(key, now) for key in keys],
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expires(timeout)
+        now = time.time()
+        rows = []
+        for key, value in data.items():
+            encoded = self._encode(value)
+            rows.append((
+                self._key(key, version), encoded, expires, now,
+                self._size(encoded),
+            ))
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(
+                'INSERT INTO cache (key, value, expires, accessed, size) '
+                'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                'value = excluded.value, expires = excluded.expires, '
+                'accessed = excluded.accessed, size = excluded.size',
+                rows,
+            )
+            self._cull(now)
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        encoded = self._encode(value)
+        now = time.time()
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = db.execute(
+                'INSERT INTO cache (key, value, expires, accessed, size) '
+                'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                'value = excluded.value, expires = excluded.expires, '
+                'accessed = excluded.accessed, size = excluded.size '
+                'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+                (key, encoded, self._expires(timeout), now,
+                 self._size(encoded), now),
+            )
+            added = cursor.rowcount > 0
+            if added:
+                self._cull(now)
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? AND '
+                '(expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            if not isinstance(row[0], int):
+                value = self._decode(row[0]) + delta
+                encoded = self._encode(value)
+                db.execute(
+                    'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                    (encoded, self._size(encoded), key),
+                )
+            else:
+                value = row[0] + delta
+                db.execute(
+                    'UPDATE cache SET value = value + ? WHERE key = ?',
+                    (delta, key),
+                )
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return value
+
+    def incr_many(self, keys, delta=1, version=None):
+        """incr для нескольких ключей в одной транзакции.
+
+        Возвращает новые значения найденных ключей; отсутствующие
+        пропускаются, а не вызывают ValueError.
+        """
+        mapping = {self._key(key, version): key for key in keys}
+        names = list(mapping)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            rows = []
+            for start in range(0, len(names), BATCH_SIZE):
+                batch = names[start:start + BATCH_SIZE]
+                where = (
+                    f'key IN ({",".join("?" * len(batch))}) AND '
+                    '(expires IS NULL OR expires > ?)'
+                )
+                # Целые увеличиваются одним UPDATE на пачку, остальные
+                # значения распаковываются по одному, как в incr.
+                db.execute(
+                    'UPDATE cache SET value = value + ? WHERE '
+                    f"{where} AND typeof(value) = 'integer'",
+                    [delta, *batch, now],
+                )
+                rows.extend(db.execute(
+                    f'SELECT key, value FROM cache WHERE {where}',
+                    [*batch, now],
+                ))
+            found, others = {}, []
+            for key, value in rows:
+                if not isinstance(value, int):
+                    value = self._decode(value) + delta
+                    encoded = self._encode(value)
+                    others.append((encoded, self._size(encoded), key))
+                found[mapping[key]] = value
+            db.executemany(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?', others
+            )
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return found
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? AND '
+            '(expires IS NULL OR expires > ?)',
+            (self._expires(timeout), self._key(key, version), time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        row = self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? AND '
+            '(expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time()),
+        ).fetchone()
+        return row is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        self._db.executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self._key(key, version),) for key in keys],
+        )
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт в потоке между запросами: открывать файл и
+        # проверять схему на каждый запрос дороже, чем держать его.
+        pass
+
+    def _cull(self, now):
+        entries, size = self._db.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        if not self._over_limit(entries, size):
+            return
+        self._db.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (now,),
+        )
+        entries, size = self._db.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+        if not self._over_limit(entries, size):
+            return
+        if self._cull_frequency == 0:
+            self._db.execute('DELETE FROM cache')
+            return
+        self._db.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (max(entries // self._cull_frequency, 1),),
+        )
+        if self._max_size is not None:
+            # Остаток сверх MAX_SIZE добирается самыми старыми записями.
+            self._db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                ' SELECT key FROM ('
+                '  SELECT key, SUM(size) OVER (ORDER BY accessed DESC)'
+                '  AS total FROM cache'
+                ' ) WHERE total > ?'
+                ')',
+                (self._max_size,),
+            )
+
+    def _over_limit(self, entries, size):
+        if entries > self._max_entries:
+            return True
+        return self._max_size is not None and size > self._max_size
+
+
+def incr_many(cache, keys, delta=1):
+    """Увеличивает ключи и возвращает новые значения найденных.
+
+    SQLiteCache делает это одной транзакцией, остальные бэкенды — по
+    одному incr на ключ.
+    """
+    if hasattr(cache, 'incr_many'):
+        return cache.incr_many(keys, delta)
+    found = {}
+    for key in keys:
+        try:
+            found[key] = cache.incr(key, delta)
+        except ValueError:
+            pass
+    return found
@@ -0,0 +1,60 @@
+import base64
+import json
+import re
+
+from django.template.loader import render_to_string
+
+# Фрагменты страницы, которые зависят от пользователя: имя -> (шаблон,
+# функция контекста).
+_registry = {}
+
+HOLE_RE = re.compile(r'<!--hole:(\w+):([\w-]*)-->.*?<!--/hole-->', re.S)
+
+
+def register(name, template_name):
+    """Регистрирует дырку в кэшированной странице.
+
+    Декорируемая функция получает request и аргументы тега {% hole %} и
+    возвращает контекст фрагмента. Аргументы должны сериализоваться в
+    JSON: они хранятся в разметке страницы.
+    """
+    def decorator(func):
+        _registry[name] = (template_name, func)
+        return func
+    return decorator
+
+
+def render(request, name, args):
+    template_name, context = _registry[name]
+    return render_to_string(
+        template_name, context(request, **args), request=request
+    )
+
+
+def _encode(args):
+    raw = json.dumps(args, sort_keys=True).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode(encoded):
+    padded = encoded + '=' * (-len(encoded) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def mark(request, name, args):
+    """Фрагмент для текущего пользователя в границах дырки."""
+    content = render(request, name, args)
+    return f'<!--hole:{name}:{_encode(args)}-->{content}<!--/hole-->'
+
+
+def punch(request, content):
+    """Перерисовывает все дырки страницы для пользователя запроса."""
+    def fill(match):
+        name, encoded = match.groups()
+        return mark(request, name, _decode(encoded))
+    return HOLE_RE.sub(fill, content)
+
+
+@register('user_nav', 'includes/user_nav.html')
+def user_nav(request, view_name=None):
+    return {'view_name': view_name}
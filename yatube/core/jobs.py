@@ -0,0 +1,149 @@
+"""Очередь фоновых задач в базе данных.
+
+Задача — функция уровня модуля и её аргументы в JSON. Строка задачи
+пишется в той же транзакции, что и данные запроса, поэтому задача не
+потеряется при падении процесса и не выполнится, если транзакцию
+откатили. Выполняет задачи manage.py runworker.
+"""
+import json
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+RETRY_DELAY = 30
+RETRY_DELAY_MAX = 60 * 60
+# Задача дольше этого в состоянии running считается брошенной упавшим
+# исполнителем и возвращается в очередь.
+STALE_AFTER = 10 * 60
+# Выполненные задачи хранятся неделю: столько же работает и ключ
+# идемпотентности.
+KEEP_DONE = timedelta(days=7)
+
+
+def task_path(func):
+    path = f'{func.__module__}.{func.__qualname__}'
+    if '<' in path:
+        raise ValueError(f'{path}: задачей может быть только функция модуля')
+    return path
+
+
+def enqueue(func, *args, priority=0, delay=0, key=None, max_attempts=None):
+    """Ставит func(*args) в очередь и возвращает Job.
+
+    Чем больше priority, тем раньше задача выполнится; delay — через
+    сколько секунд её можно брать. Задача с уже известным key не
+    создаётся повторно: возвращается существующая.
+    """
+    fields = {
+        'task': task_path(func),
+        'args': json.dumps(args, ensure_ascii=False),
+        'priority': priority,
+        'run_at': timezone.now() + timedelta(seconds=delay),
+    }
+    if max_attempts is not None:
+        fields['max_attempts'] = max_attempts
+    if key is None:
+        return Job.objects.create(**fields)
+    try:
+        with transaction.atomic():
+            return Job.objects.create(key=key, **fields)
+    except IntegrityError:
+        return Job.objects.get(key=key)
+
+
+def claim(worker, limit):
+    """Берёт до limit готовых задач и помечает их как выполняемые.
+
+    Кандидат достаётся тому, чей UPDATE первым сменил его состояние,
+    поэтому исполнители в разных процессах не берут одну задачу дважды.
+    """
+    now = timezone.now()
+    candidates = Job.objects.filter(
+        status=Job.QUEUED, run_at__lte=now
+    ).order_by('-priority', 'run_at', 'pk').values_list('pk', flat=True)
+    claimed = []
+    for pk in candidates[:limit * 2]:
+        taken = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker, locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if taken:
+            claimed.append(pk)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def retry_delay(attempts):
+    """Экспоненциальная пауза перед повтором, со случайным разбросом."""
+    delay = min(RETRY_DELAY * 2 ** (attempts - 1), RETRY_DELAY_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def execute(job):
+    """Выполняет взятую задачу и записывает результат."""
+    try:
+        func = import_string(job.task)
+        func(*json.loads(job.args))
+    except Exception:
+        logger.exception('Задача %s упала', job)
+        fail(job, traceback.format_exc())
+        return False
+    Job.objects.filter(pk=job.pk).update(
+        status=Job.DONE, finished_at=timezone.now(), last_error=''
+    )
+    return True
+
+
+def fail(job, error):
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        changes = {'status': Job.FAILED, 'finished_at': now}
+    else:
+        changes = {
+            'status': Job.QUEUED,
+            'run_at': now + timedelta(seconds=retry_delay(job.attempts)),
+        }
+    Job.objects.filter(pk=job.pk).update(last_error=error, **changes)
+
+
+def perform(pk):
+    """Выполняет задачу pk в потоке или процессе исполнителя."""
+    close_old_connections()
+    try:
+        job = Job.objects.filter(pk=pk, status=Job.RUNNING).first()
+        if job is not None:
+            execute(job)
+    finally:
+        close_old_connections()
+
+
+def requeue_stale(timeout=STALE_AFTER):
+    """Возвращает в очередь задачи, брошенные упавшими исполнителями."""
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(seconds=timeout),
+    )
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=timezone.now(),
+        last_error='Исполнитель не завершил задачу',
+    )
+    return failed + stale.update(status=Job.QUEUED)
+
+
+def purge(keep=KEEP_DONE):
+    """Удаляет давно выполненные задачи."""
+    deleted, _ = Job.objects.filter(
+        status=Job.DONE, finished_at__lt=timezone.now() - keep
+    ).delete()
+    return deleted
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from . import background
+
+FIELDS = (
+    'subject', 'body', 'from_email', 'to', 'cc', 'bcc', 'reply_to',
+    'extra_headers', 'alternatives',
+)
+
+
+def send(message):
+    """Отправляет письмо из очереди через EMAIL_DELIVERY_BACKEND."""
+    connection = get_connection(settings.EMAIL_DELIVERY_BACKEND)
+    # В JSON пары (содержимое, тип) превратились в списки.
+    alternatives = [tuple(item) for item in message.pop('alternatives') or []]
+    EmailMultiAlternatives(
+        headers=message.pop('extra_headers'),
+        alternatives=alternatives,
+        connection=connection,
+        **message,
+    ).send()
+
+
+class EmailBackend(BaseEmailBackend):
+    """Почта через фоновые задачи: запрос не ждёт отправки.
+
+    Письмо с вложениями отправляется сразу: вложения не кладутся в
+    очередь.
+    """
+
+    def send_messages(self, email_messages):
+        sent = 0
+        for message in email_messages:
+            if message.attachments:
+                message.connection = get_connection(
+                    settings.EMAIL_DELIVERY_BACKEND
+                )
+                sent += message.send()
+                continue
+            fields = {field: getattr(message, field, None) for field in FIELDS}
+            background.defer(send, fields, priority=10)
+            sent += 1
+        return sent
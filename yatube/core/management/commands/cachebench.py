@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+BATCH = 20
+
+
+def bench_set(cache, keys, value):
+    for key in keys:
+        cache.set(key, value)
+
+
+def bench_get(cache, keys, value):
+    for key in keys:
+        cache.get(key)
+
+
+def bench_get_many(cache, keys, value):
+    for start in range(0, len(keys), BATCH):
+        cache.get_many(keys[start:start + BATCH])
+
+
+def bench_set_many(cache, keys, value):
+    for start in range(0, len(keys), BATCH):
+        cache.set_many({key: value for key in keys[start:start + BATCH]})
+
+
+def bench_incr(cache, keys, value):
+    cache.set('counter', 0)
+    for _ in keys:
+        cache.incr('counter')
+
+
+SCENARIOS = (
+    ('set', bench_set),
+    ('get', bench_get),
+    ('set_many', bench_set_many),
+    ('get_many', bench_get_many),
+    ('incr', bench_incr),
+)
+
+
+def write_in_child(cache, keys):
+    for key in keys:
+        cache.set(key, 1)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает SQLiteCache с LocMemCache и FileBasedCache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ops', type=int, default=2000)
+        parser.add_argument('--value-size', type=int, default=1024)
+
+    def handle(self, *args, **options):
+        ops = options['ops']
+        value = 'x' * options['value_size']
+        keys = [f'bench:{i}' for i in range(ops)]
+        params = {'OPTIONS': {'MAX_ENTRIES': ops * 10}}
+        with tempfile.TemporaryDirectory() as directory:
+            backends = (
+                ('locmem', LocMemCache('cachebench', params)),
+                ('filebased', FileBasedCache(
+                    os.path.join(directory, 'files'), params
+                )),
+                ('sqlite', SQLiteCache(
+                    os.path.join(directory, 'cache.sqlite3'), params
+                )),
+            )
+            header = ['backend'] + [name for name, _ in SCENARIOS]
+            self.stdout.write(
+                ' '.join(f'{title:>10}' for title in header)
+                + '  cross-process hits'
+            )
+            for name, cache in backends:
+                cache.clear()
+                row = [name]
+                for _, scenario in SCENARIOS:
+                    started = time.perf_counter()
+                    scenario(cache, keys, value)
+                    elapsed = time.perf_counter() - started
+                    row.append(f'{ops / elapsed:.0f}')
+                hits = self.cross_process_hits(cache, keys)
+                self.stdout.write(
+                    ' '.join(f'{cell:>10}' for cell in row)
+                    + f'  {hits:>17.0%}'
+                )
+        self.stdout.write('Числа — операций в секунду.')
+
+    def cross_process_hits(self, cache, keys):
+        """Доля ключей, записанных дочерним процессом, видимых в текущем."""
+        keys = [f'child:{key}' for key in keys]
+        context = multiprocessing.get_context('fork')
+        child = context.Process(target=write_in_child, args=(cache, keys))
+        child.start()
+        child.join()
+        return len(cache.get_many(keys)) / len(keys)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core.stampede import metrics, reset_metrics
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания в кэш лент и фрагментов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true', help='Обнулить счётчики'
+        )
+
+    def handle(self, *args, **options):
+        counts = metrics()
+        for event, count in counts.items():
+            self.stdout.write(f'{event:>6}: {count}')
+        total = sum(counts.values())
+        served = counts['hit'] + counts['stale']
+        rate = served / total if total else 0
+        self.stdout.write(f'Доля ответов из кэша: {rate:.1%}')
+        if options['reset']:
+            reset_metrics()
+            self.stdout.write('Счётчики обнулены.')
@@ -0,0 +1,97 @@
+import os
+import signal
+import socket
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait,
+)
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from core import jobs
+
+# Как часто возвращать брошенные задачи и удалять старые выполненные.
+MAINTENANCE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи из очереди core.jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.BACKGROUND_WORKERS,
+            help='Сколько задач выполнять одновременно',
+        )
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Пул процессов вместо пула потоков',
+        )
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help='Пауза между опросами пустой очереди, секунды',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выйти, когда готовых задач не останется',
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        size = options['workers']
+        if options['processes']:
+            # Дочерние процессы не должны унаследовать открытые
+            # соединения с базой.
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=size)
+        else:
+            pool = ThreadPoolExecutor(
+                max_workers=size, thread_name_prefix='worker'
+            )
+        self.stdout.write(f'Исполнитель {worker}: {size} задач за раз')
+        handlers = {
+            signum: signal.signal(signum, self.stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            with pool:
+                done = self.loop(pool, worker, size, options)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        self.stdout.write(f'Выполнено задач: {done}')
+
+    def stop(self, signum, frame):
+        # Новые задачи не берутся, начатые доделываются.
+        self.stopping = True
+
+    def loop(self, pool, worker, size, options):
+        running = set()
+        done = 0
+        maintained_at = None
+        while not self.stopping:
+            close_old_connections()
+            now = time.monotonic()
+            if maintained_at is None or (
+                    now - maintained_at > MAINTENANCE_INTERVAL):
+                jobs.requeue_stale()
+                jobs.purge()
+                maintained_at = now
+            if len(running) < size:
+                claimed = jobs.claim(worker, size - len(running))
+                running.update(
+                    pool.submit(jobs.perform, pk) for pk in claimed
+                )
+            if not running:
+                if options['burst']:
+                    break
+                time.sleep(options['poll'])
+                continue
+            finished, running = wait(
+                running, timeout=options['poll'], return_when=FIRST_COMPLETED
+            )
+            done += len(finished)
+        wait(running)
+        return done + len(running)
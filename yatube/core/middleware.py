@@ -0,0 +1,150 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import parse_http_date_safe
+
+from core import holes
+from core.querybudget import QueryStats
+
+logger = logging.getLogger(__name__)
+
+PAGE_TIMEOUT = 600
+
+
+def depend(request, generations):
+    """Отмечает, от каких ключей поколений зависит страница.
+
+    Только такие страницы PageCacheMiddleware сохраняет целиком.
+    """
+    found = getattr(request, 'page_dependencies', {})
+    found.update(generations)
+    request.page_dependencies = found
+
+
+def anonymous(request):
+    """Аноним ли пользователь; без cookie сессии — без обращения к ней."""
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return True
+    return not request.user.is_authenticated
+
+
+def page_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'page:{path}'
+
+
+class PageCacheMiddleware:
+    """Кэш страниц целиком для анонимных читателей.
+
+    Сохраняются ответы анонимам на страницы, отметившие свои зависимости
+    через depend(). Запись действительна, пока поколения зависимостей не
+    изменились. Анонимы без cookie сессии получают страницу без обращения
+    к сессии и базе; вошедшим пользователям отдаётся та же страница, в
+    которой перерисованы только дырки {% hole %}.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return self.get_response(request)
+        key = page_key(request)
+        response = self.cached(request, key)
+        if response is not None:
+            return response
+        response = self.get_response(request)
+        if self.storable(request, response):
+            cache.set(key, (
+                request.page_dependencies,
+                response.content.decode(response.charset),
+                response['Content-Type'],
+                response.get('ETag'),
+                response.get('Last-Modified'),
+            ), PAGE_TIMEOUT)
+        return response
+
+    def cached(self, request, key):
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        dependencies, content, content_type, etag, last_modified = entry
+        if cache.get_many(list(dependencies)) != dependencies:
+            return None
+        if anonymous(request):
+            timestamp = parse_http_date_safe(last_modified or '')
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp
+            )
+            if response is None:
+                response = HttpResponse(content, content_type=content_type)
+            if etag:
+                response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = last_modified
+        else:
+            response = HttpResponse(
+                holes.punch(request, content), content_type=content_type
+            )
+        response['X-Page-Cache'] = 'hit'
+        patch_vary_headers(response, ('Cookie',))
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def storable(self, request, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and getattr(request, 'page_dependencies', None)
+            and response.get('Content-Type', '').startswith('text/html')
+            and anonymous(request)
+        )
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы каждого запроса и сверяет их с бюджетом view.
+
+    Бюджет задаётся декоратором query_budget. Превышение пишется в лог
+    вместе с повторяющимися запросами; в режиме DEBUG числа видны в
+    заголовках X-Query-*. Статистика доступна как request.query_stats.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        request.query_stats = stats
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        match = request.resolver_match
+        name = match.view_name if match else request.path
+        if stats.over_budget:
+            logger.warning(
+                '%s: %d SQL-запросов при бюджете %d, повторы: %s',
+                name, stats.count, stats.budget,
+                sorted(stats.duplicates.items(), key=lambda item: -item[1]),
+            )
+        if settings.DEBUG:
+            response['X-Query-Count'] = stats.count
+            response['X-Query-Time'] = f'{stats.time * 1000:.1f}ms'
+            response['X-Query-Duplicates'] = sum(
+                count - 1 for count in stats.duplicates.values()
+            )
+            if stats.budget is not None:
+                response['X-Query-Budget'] = stats.budget
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        budget = getattr(view_func, 'query_budget', None)
+        if request.method not in ('GET', 'HEAD'):
+            budget = getattr(view_func, 'write_query_budget', budget)
+        request.query_stats.budget = budget
@@ -9,3 +9,54 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class Job(models.Model):
+    """Фоновая задача в очереди: функция по пути импорта и её аргументы.
+
+    Задачи выполняет manage.py runworker; ставит их core.jobs.enqueue.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Не удалась'),
+    )
+
+    task = models.CharField('Функция', max_length=200)
+    args = models.TextField('Аргументы (JSON)', default='[]')
+    key = models.CharField(
+        'Ключ идемпотентности', max_length=200, unique=True, null=True,
+        blank=True,
+    )
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUSES, default=QUEUED
+    )
+    priority = models.SmallIntegerField('Приоритет', default=0)
+    run_at = models.DateTimeField('Выполнить не раньше')
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'Попыток не больше', default=5
+    )
+    locked_by = models.CharField('Исполнитель', max_length=100, blank=True)
+    locked_at = models.DateTimeField('Взята', null=True, blank=True)
+    finished_at = models.DateTimeField('Завершена', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [
+            models.Index(
+                fields=['status', '-priority', 'run_at'],
+                name='job_queue_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.task} #{self.pk}'
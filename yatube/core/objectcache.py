@@ -0,0 +1,168 @@
+"""Кэш строк модели по уникальному полю.
+
+Строка лежит в общем кэше под ключом obj:<модель>:<поле>:<значение>.
+Отсутствующие строки тоже запоминаются, но ненадолго, чтобы запросы
+несуществующих адресов не доходили до базы. Записи сбрасывают сигналы
+сохранения и удаления: создание строки убирает и отрицательную запись.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import QuerySet
+from django.http import Http404
+
+MISSING = 'missing'
+TIMEOUT = 60 * 60
+NEGATIVE_TIMEOUT = 60
+
+
+class ObjectCache:
+    """Чтение строк модели через кэш: по одной и пачкой.
+
+    queryset задаёт столбцы, например без хэша пароля; name отличает
+    ключи кэшей одной модели с разными столбцами. related — внешние
+    ключи, которые подставляются из своих кэшей по id: строка хранится
+    без связанных объектов, поэтому их правка не требует сбрасывать её
+    запись.
+    """
+
+    def __init__(self, queryset, field='pk', related=None,
+                 timeout=TIMEOUT, name=None):
+        if not isinstance(queryset, QuerySet):
+            queryset = queryset._default_manager.all()
+        self.queryset = queryset
+        self.model = queryset.model
+        self.field = field
+        self.related = related or {}
+        self.timeout = timeout
+        name = name or self.model._meta.label_lower
+        self.prefix = f'obj:{name}:{field}'
+
+    def key(self, value):
+        return f'{self.prefix}:{value}'
+
+    def value(self, instance):
+        return getattr(instance, self.field)
+
+    def get(self, value):
+        """Объект с полем, равным value, или None."""
+        return self.get_many([value]).get(value)
+
+    def get_or_404(self, value):
+        instance = self.get(value)
+        if instance is None:
+            raise Http404(
+                f'{self.model._meta.verbose_name} {value} не найден'
+            )
+        return instance
+
+    def missing(self, value):
+        """Известно ли, что строки нет: в кэше отрицательная запись."""
+        return cache.get(self.key(value)) == MISSING
+
+    def get_many(self, values):
+        """{значение: объект} одним get_many; промахи — одним запросом.
+
+        Отсутствующих значений в ответе нет.
+        """
+        keys = {self.key(value): value for value in values}
+        found = cache.get_many(keys)
+        missing = [value for key, value in keys.items() if key not in found]
+        if missing:
+            fetched = self.fetch(missing)
+            cache.set_many({
+                key: MISSING for key in keys
+                if key not in found and key not in fetched
+            }, NEGATIVE_TIMEOUT)
+            found.update(fetched)
+        objects = {
+            value: found[key] for key, value in keys.items()
+            if isinstance(found.get(key), self.model)
+        }
+        self.attach(objects.values())
+        return objects
+
+    def fetch(self, values):
+        """Читает строки из базы и кладёт их в кэш: {ключ: объект}.
+
+        Порядок строк не нужен, поэтому сортировка модели снимается: иначе
+        выборка по IN сортировалась бы во временном дереве.
+        """
+        queryset = self.queryset.filter(**{f'{self.field}__in': values})
+        return self.store(self.shape(queryset.order_by()))
+
+    def shape(self, queryset):
+        """queryset со столбцами кэша и связанными объектами related.
+
+        Связанные объекты читаются тем же запросом с теми же столбцами,
+        что у их кэшей.
+        """
+        names, defer = self.queryset.query.deferred_loading
+        names = set(names)
+        for name, objects in self.related.items():
+            hidden = objects.queryset.query.deferred_loading[0]
+            if defer:
+                names |= {f'{name}__{field}' for field in hidden}
+            else:
+                names |= {
+                    f'{name}__{field.name}'
+                    for field in objects.model._meta.concrete_fields
+                    if field.name not in hidden
+                }
+        queryset = queryset.select_related(*self.related)
+        if defer:
+            return queryset.defer(*names)
+        return queryset.only(*names)
+
+    def store(self, instances):
+        """Кладёт в кэш строки, прочитанные через shape: {ключ: объект}.
+
+        Связанные объекты попадают в свои кэши, а строка — без них.
+        """
+        instances = list(instances)
+        attached = []
+        for name, objects in self.related.items():
+            field = self.model._meta.get_field(name)
+            related = {}
+            for instance in instances:
+                target = field.get_cached_value(instance, None)
+                if target is not None:
+                    related[objects.key(objects.value(target))] = target
+                    attached.append((field, instance, target))
+                    field.delete_cached_value(instance)
+            cache.set_many(related, objects.timeout)
+        stored = {
+            self.key(self.value(instance)): instance
+            for instance in instances
+        }
+        cache.set_many(stored, self.timeout)
+        for field, instance, target in attached:
+            field.set_cached_value(instance, target)
+        return stored
+
+    def attach(self, instances):
+        for name, objects in self.related.items():
+            field = self.model._meta.get_field(name)
+            pending = [
+                instance for instance in instances
+                if not field.is_cached(instance)
+            ]
+            ids = {getattr(instance, field.attname) for instance in pending}
+            ids.discard(None)
+            if not ids:
+                continue
+            related = objects.get_many(ids)
+            for instance in pending:
+                target = related.get(getattr(instance, field.attname))
+                if target is not None:
+                    field.set_cached_value(instance, target)
+
+    def forget(self, *values):
+        """Сбрасывает записи сразу и ещё раз после фиксации транзакции.
+
+        Второй сброс убирает строку, которую параллельный запрос успел
+        прочитать и положить в кэш до фиксации.
+        """
+        keys = [self.key(value) for value in values if value is not None]
+        if keys:
+            cache.delete_many(keys)
+            transaction.on_commit(lambda: cache.delete_many(keys))
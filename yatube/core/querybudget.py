@@ -0,0 +1,73 @@
+import re
+import time
+from collections import Counter
+from functools import wraps
+
+PLACEHOLDERS_RE = re.compile(r'%s(, %s)+')
+
+
+def fingerprint(sql):
+    """SQL без параметров; списки IN (%s, %s, ...) сворачиваются."""
+    return PLACEHOLDERS_RE.sub('%s', sql)
+
+
+class QueryStats:
+    """Запросы одного HTTP-запроса: число, время и повторы.
+
+    Подключается к соединению через connection.execute_wrapper.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.count = 0
+        self.time = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        """Запросы, выполненные больше одного раза: признак N+1."""
+        return {
+            sql: count for sql, count in self.fingerprints.items()
+            if count > 1
+        }
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+
+def query_budget(budget, write=None):
+    """Сколько SQL-запросов допустимо для view.
+
+    write — бюджет запросов, меняющих данные (POST и прочих небезопасных
+    методов), если он не такой, как у чтения. Превышение
+    QueryBudgetMiddleware пишет в лог, а assert_query_budget превращает в
+    упавший тест.
+    """
+    def decorator(view):
+        @wraps(view)
+        def inner(*args, **kwargs):
+            return view(*args, **kwargs)
+        inner.query_budget = budget
+        inner.write_query_budget = budget if write is None else write
+        return inner
+    return decorator
+
+
+def extend_budget(request, extra):
+    """Добавляет к бюджету view запросы, число которых зависит от данных.
+
+    Например, по запросу на каждого популярного автора в ленте подписок.
+    """
+    stats = getattr(request, 'query_stats', None)
+    if stats is not None and stats.budget is not None:
+        stats.budget += extra
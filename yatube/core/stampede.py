@@ -0,0 +1,116 @@
+import math
+import random
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+LOCK_TIMEOUT = 30
+WAIT_TIMEOUT = 2
+WAIT_STEP = 0.05
+# Чем больше BETA, тем раньше до истечения срока начинается пересборка.
+BETA = 1.0
+# Сколько сроков жизни после истечения значение ещё можно отдавать
+# устаревшим, пока кто-то один его пересобирает.
+STALE_FACTOR = 2
+FLUSH_INTERVAL = 5
+EVENTS = ('hit', 'miss', 'stale', 'early')
+
+_counts = Counter()
+_counts_lock = threading.Lock()
+_flushed = time.monotonic()
+
+
+def metric_key(event):
+    return f'stampede:{event}'
+
+
+def flush():
+    """Переносит счётчики процесса в общий кэш."""
+    global _flushed
+    with _counts_lock:
+        counts = dict(_counts)
+        _counts.clear()
+        _flushed = time.monotonic()
+    for event, count in counts.items():
+        key = metric_key(event)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            if not cache.add(key, count, None):
+                cache.incr(key, count)
+
+
+def record(event):
+    with _counts_lock:
+        _counts[event] += 1
+        due = time.monotonic() - _flushed >= FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+def metrics():
+    flush()
+    found = cache.get_many([metric_key(event) for event in EVENTS])
+    return {event: found.get(metric_key(event), 0) for event in EVENTS}
+
+
+def reset_metrics():
+    with _counts_lock:
+        _counts.clear()
+    cache.delete_many([metric_key(event) for event in EVENTS])
+
+
+def _wait(key, version):
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None and entry[1] == version:
+            return entry
+    return None
+
+
+def get_or_build(key, build, timeout, version=None):
+    """Значение из кэша с защитой от одновременной пересборки.
+
+    Пересобирает значение только тот, кто взял блокировку ключа;
+    остальные получают устаревшее значение или ждут первого. Незадолго
+    до истечения срока пересборка запускается заранее с вероятностью,
+    растущей к концу срока (XFetch). Значение с другим version считается
+    устаревшим.
+    """
+    lock = f'lock:{key}'
+    entry = cache.get(key)
+    fresh = False
+    if entry is not None:
+        value, entry_version, delta, expiry = entry
+        fresh = entry_version == version
+        early = delta * BETA * math.log(1 - random.random())
+        if fresh and time.time() - early < expiry:
+            record('hit')
+            return value
+    locked = cache.add(lock, 1, LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            record('stale')
+            return value
+        entry = _wait(key, version)
+        if entry is not None:
+            record('hit')
+            return entry[0]
+    record('early' if fresh and time.time() < expiry else 'miss')
+    try:
+        started = time.perf_counter()
+        value = build()
+        delta = time.perf_counter() - started
+        cache.set(
+            key,
+            (value, version, delta, time.time() + timeout),
+            timeout * STALE_FACTOR,
+        )
+    finally:
+        if locked:
+            cache.delete(lock)
+    return value
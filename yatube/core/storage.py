@@ -0,0 +1,65 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+# Каталог из двух первых символов хэша, чтобы не класть всё в один.
+DIGEST_RE = re.compile(r'/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def content_name(name, digest):
+    """Имя файла с содержимым digest: каталог из name, расширение тоже."""
+    directory = posixpath.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    return posixpath.join(directory, digest[:2], f'{digest}{extension}')
+
+
+def is_content_addressed(name):
+    return bool(DIGEST_RE.search(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла — SHA-256 его содержимого.
+
+    Одинаковые загрузки хранятся одним файлом, поэтому и миниатюры с
+    вариантами, которые привязаны к имени, создаются для него один раз.
+    Хэш считается при потоковой записи во временный файл, который затем
+    атомарно переносится на место; если такой файл уже есть, копия
+    удаляется.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Совпадение имён означает совпадение содержимого: перезапись
+        # ничего не меняет, суффиксы не нужны.
+        return name
+
+    def _save(self, name, content):
+        directory = self.path(posixpath.dirname(name))
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    digest.update(chunk)
+                    file.write(chunk)
+            name = content_name(name, digest.hexdigest())
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temporary)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # mkstemp создаёт файл с правами 0600.
+                os.chmod(temporary, self.file_permissions_mode or 0o644)
+                os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
@@ -0,0 +1,12 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core import holes
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, **args):
+    """{% hole name key=value ... %} — фрагмент, зависящий от пользователя."""
+    return mark_safe(holes.mark(context.get('request'), name, args))
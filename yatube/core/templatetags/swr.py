@@ -0,0 +1,40 @@
+from django import template
+
+from core.stampede import get_or_build
+
+register = template.Library()
+
+
+class SWRCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, key, version):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.key = key
+        self.version = version
+
+    def render(self, context):
+        timeout = int(self.timeout.resolve(context))
+        key = f'fragment:{self.key.resolve(context)}'
+        version = self.version.resolve(context) if self.version else None
+        return get_or_build(
+            key, lambda: self.nodelist.render(context), timeout, version
+        )
+
+
+@register.tag
+def swrcache(parser, token):
+    """{% swrcache timeout key [version] %}...{% endswrcache %}"""
+    bits = token.split_contents()
+    if len(bits) not in (3, 4):
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' принимает срок, ключ и необязательную версию"
+        )
+    nodelist = parser.parse(('endswrcache',))
+    parser.delete_first_token()
+    version = parser.compile_filter(bits[3]) if len(bits) == 4 else None
+    return SWRCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        version,
+    )
@@ -0,0 +1,66 @@
+import copy
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+@contextmanager
+def testing_settings():
+    """Настройки на время тестов.
+
+    Фоновые задачи выполняются сразу: тесты видят их результат, а
+    тесты с transaction=True не удаляют MEDIA_ROOT, пока фоновый поток
+    ещё пишет туда миниатюры. Кэш и загрузки лежат во временном
+    каталоге: тесты чистят кэш, и общий файл запущенного сервера они бы
+    стёрли, а картинки остались бы в media проекта. Включают настройки
+    TestRunner для manage.py test и conftest.py для pytest.
+    """
+    directory = tempfile.mkdtemp(prefix='yatube-test-')
+    caches = copy.deepcopy(settings.CACHES)
+    caches['default']['LOCATION'] = os.path.join(directory, 'cache.sqlite3')
+    try:
+        with override_settings(
+            BACKGROUND_EAGER=True,
+            CACHES=caches,
+            MEDIA_ROOT=os.path.join(directory, 'media'),
+        ):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    """manage.py test с настройками testing_settings."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._settings = ExitStack()
+        self._settings.enter_context(testing_settings())
+
+    def teardown_test_environment(self, **kwargs):
+        self._settings.close()
+        super().teardown_test_environment(**kwargs)
+
+
+def assert_query_budget(client, url, data=None, **extra):
+    """Запрашивает url и проверяет, что view уложилась в свой бюджет.
+
+    С data отправляет POST. Работает и в pytest, и в unittest; возвращает
+    ответ.
+    """
+    if data is None:
+        response = client.get(url, **extra)
+    else:
+        response = client.post(url, data, **extra)
+    stats = response.wsgi_request.query_stats
+    assert stats.budget is not None, f'{url}: у view нет query_budget'
+    assert not stats.over_budget, (
+        f'{url}: {stats.count} SQL-запросов при бюджете {stats.budget}, '
+        f'повторы: {stats.duplicates}'
+    )
+    return response
@@ -0,0 +1,50 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from core import background
+
+
+class DeferTest(SimpleTestCase):
+    @override_settings(BACKGROUND_EAGER=False, BACKGROUND_QUEUE=False)
+    def test_runs_after_commit_in_background_thread(self):
+        done = threading.Event()
+        threads = []
+
+        def task(value):
+            threads.append((threading.current_thread().name, value))
+            done.set()
+
+        with mock.patch.object(
+            background.transaction, 'on_commit'
+        ) as on_commit:
+            background.defer(task, 1)
+            self.assertEqual(threads, [])
+            on_commit.call_args[0][0]()
+        self.assertTrue(done.wait(5))
+        name, value = threads[0]
+        self.assertTrue(name.startswith('background'))
+        self.assertEqual(value, 1)
+
+    @override_settings(BACKGROUND_EAGER=True)
+    def test_eager_runs_inline(self):
+        calls = []
+        background.defer(calls.append, 'сразу')
+        self.assertEqual(calls, ['сразу'])
+
+    @override_settings(BACKGROUND_EAGER=True)
+    def test_eager_failure_logged(self):
+        def broken():
+            raise ValueError('сломалось')
+
+        with self.assertLogs('core.background', 'ERROR'):
+            background.defer(broken)
+
+    def test_failure_logged(self):
+        def broken():
+            raise ValueError('сломалось')
+
+        with self.assertLogs('core.background', 'ERROR') as logs:
+            background._run(broken, ())
+        self.assertIn('broken', logs.output[0])
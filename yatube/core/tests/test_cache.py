@@ -0,0 +1,109 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+
+from core.cache import SQLiteCache, incr_many
+
+
+def write_in_child(cache):
+    cache.set('from_child', 'значение')
+    cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(
+            os.path.join(self.directory, 'cache.sqlite3'),
+            {'OPTIONS': options},
+        )
+
+    def test_set_get_and_get_many(self):
+        self.cache.set('a', {'ключ': [1, 2]})
+        self.cache.set_many({'b': 'строка', 'c': 3})
+        self.assertEqual(self.cache.get('a'), {'ключ': [1, 2]})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c', 'missing']),
+            {'a': {'ключ': [1, 2]}, 'b': 'строка', 'c': 3},
+        )
+        self.assertEqual(self.cache.get('missing', 'default'), 'default')
+
+    def test_add_incr_and_expiry(self):
+        self.assertTrue(self.cache.add('gen', 10))
+        self.assertFalse(self.cache.add('gen', 20))
+        self.assertEqual(self.cache.incr('gen'), 11)
+        self.assertEqual(self.cache.decr('gen', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('short', 1, timeout=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 2))
+
+    def test_incr_many(self):
+        self.cache.set_many({'a': 1, 'b': 10, 'pickled': 1.5})
+        self.cache.set('expired', 5, timeout=0.01)
+        time.sleep(0.02)
+        self.assertEqual(
+            self.cache.incr_many(['a', 'b', 'pickled', 'expired', 'missing']),
+            {'a': 2, 'b': 11, 'pickled': 2.5},
+        )
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'pickled', 'missing']),
+            {'a': 2, 'b': 11, 'pickled': 2.5},
+        )
+        self.assertEqual(incr_many(self.cache, ['a'], 3), {'a': 5})
+
+    def test_incr_many_falls_back_to_incr(self):
+        other = LocMemCache('incr-many', {})
+        other.set('a', 1)
+        self.assertEqual(incr_many(other, ['a', 'missing']), {'a': 2})
+
+    def test_lru_eviction_respects_max_entries(self):
+        cache = self.make_cache(MAX_ENTRIES=10, CULL_FREQUENCY=2)
+        for i in range(30):
+            cache.set(f'key{i}', i)
+        entries = cache._db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        self.assertLessEqual(entries[0], 10)
+        self.assertEqual(cache.get('key29'), 29)
+
+    def test_size_bound(self):
+        cache = self.make_cache(MAX_SIZE=4096)
+        for i in range(20):
+            cache.set(f'key{i}', 'x' * 1000)
+        size = cache._db.execute('SELECT size FROM cache_stats').fetchone()
+        self.assertLessEqual(size[0], 4096)
+
+    def test_shared_between_processes(self):
+        self.cache.set('counter', 1)
+        context = multiprocessing.get_context('fork')
+        child = context.Process(target=write_in_child, args=(self.cache,))
+        child.start()
+        child.join()
+        self.assertEqual(self.cache.get('from_child'), 'значение')
+        self.assertEqual(self.cache.get('counter'), 2)
+
+
+class TestCacheLocationTest(SimpleTestCase):
+    def test_tests_do_not_share_server_cache(self):
+        self.assertNotEqual(
+            os.path.dirname(caches['default']._path), settings.BASE_DIR
+        )
+
+    def test_tests_do_not_write_project_media(self):
+        self.assertNotEqual(
+            settings.MEDIA_ROOT, os.path.join(settings.BASE_DIR, 'media')
+        )
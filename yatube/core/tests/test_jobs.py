@@ -0,0 +1,132 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import background, jobs
+from core.models import Job
+
+calls = []
+
+
+def record(*args):
+    calls.append(args)
+
+
+def broken():
+    raise ValueError('сломалось')
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_and_execute(self):
+        job = jobs.enqueue(record, 1, 'два')
+        self.assertEqual(job.task, 'core.tests.test_jobs.record')
+        [pk] = jobs.claim('test', 10)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.RUNNING, 1))
+        self.assertTrue(jobs.execute(job))
+        self.assertEqual(calls, [(1, 'два')])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+
+    def test_only_module_functions(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue(lambda: None)
+
+    def test_key_is_idempotent(self):
+        first = jobs.enqueue(record, 1, key='post:1')
+        second = jobs.enqueue(record, 2, key='post:1')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_priority_and_delay(self):
+        low = jobs.enqueue(record, priority=-1)
+        high = jobs.enqueue(record, priority=5)
+        jobs.enqueue(record, priority=10, delay=60)
+        self.assertEqual(jobs.claim('test', 10), [high.pk, low.pk])
+
+    def test_failure_retried_then_failed(self):
+        job = jobs.enqueue(broken, max_attempts=2)
+        for status in (Job.QUEUED, Job.FAILED):
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            jobs.claim('test', 1)
+            job.refresh_from_db()
+            with self.assertLogs('core.jobs', 'ERROR'):
+                self.assertFalse(jobs.execute(job))
+            job.refresh_from_db()
+            self.assertEqual(job.status, status)
+            self.assertIn('сломалось', job.last_error)
+        self.assertEqual(job.attempts, 2)
+
+    def test_retry_is_delayed(self):
+        job = jobs.enqueue(broken)
+        jobs.claim('test', 1)
+        job.refresh_from_db()
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.execute(job)
+        job.refresh_from_db()
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertEqual(jobs.claim('test', 1), [])
+
+    def test_stale_requeued(self):
+        job = jobs.enqueue(record)
+        jobs.claim('test', 1)
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(jobs.requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+
+    @override_settings(BACKGROUND_EAGER=False, BACKGROUND_QUEUE=True)
+    def test_defer_enqueues(self):
+        background.defer(record, 3)
+        self.assertTrue(
+            Job.objects.filter(task='core.tests.test_jobs.record').exists()
+        )
+        self.assertEqual(calls, [])
+
+
+class RunWorkerTest(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_burst_runs_all_jobs(self):
+        for i in range(5):
+            jobs.enqueue(record, i)
+        jobs.enqueue(broken, max_attempts=1)
+        out = StringIO()
+        with self.assertLogs('core.jobs', 'ERROR'):
+            call_command('runworker', burst=True, workers=2, stdout=out)
+        self.assertEqual(sorted(calls), [(i,) for i in range(5)])
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 5)
+        self.assertEqual(Job.objects.filter(status=Job.FAILED).count(), 1)
+        self.assertIn('Выполнено задач: 6', out.getvalue())
+
+
+@override_settings(
+    EMAIL_BACKEND='core.mail.EmailBackend',
+    EMAIL_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    BACKGROUND_EAGER=False,
+    BACKGROUND_QUEUE=True,
+)
+class QueuedEmailTest(TestCase):
+    def test_sent_by_job(self):
+        message = mail.EmailMultiAlternatives(
+            'Сброс пароля', 'Ссылка', 'from@yatube.ru', ['to@yatube.ru']
+        )
+        message.attach_alternative('<p>Ссылка</p>', 'text/html')
+        self.assertEqual(message.send(), 1)
+        self.assertEqual(mail.outbox, [])
+        [pk] = jobs.claim('test', 1)
+        jobs.execute(Job.objects.get(pk=pk))
+        [sent] = mail.outbox
+        self.assertEqual(sent.subject, 'Сброс пароля')
+        self.assertEqual(sent.to, ['to@yatube.ru'])
+        self.assertEqual(sent.alternatives, [('<p>Ссылка</p>', 'text/html')])
@@ -0,0 +1,83 @@
+from django.core.cache import cache
+from django.db import connection
+from django.http import Http404
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from posts import objects
+from posts.models import Comment, Group, Post, User
+
+
+class ObjectCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_row_read_once(self):
+        self.assertEqual(objects.groups.get('test-slug'), self.group)
+        self.assertEqual(objects.users.get('author'), self.author)
+        with self.assertNumQueries(0):
+            self.assertEqual(objects.groups.get('test-slug'), self.group)
+            self.assertEqual(objects.users.get('author'), self.author)
+
+    def test_get_many_fetches_misses_in_one_query(self):
+        other = Group.objects.create(title='Другая', slug='other')
+        objects.groups.get('test-slug')
+        with self.assertNumQueries(1):
+            found = objects.groups.get_many(['test-slug', 'other', 'none'])
+        self.assertEqual(found, {'test-slug': self.group, 'other': other})
+
+    def test_fetch_not_sorted(self):
+        with CaptureQueriesContext(connection) as queries:
+            objects.posts.get(self.post.pk)
+        self.assertNotIn('ORDER BY', queries[0]['sql'])
+
+    def test_post_gets_author_and_group_from_caches(self):
+        objects.posts.get(self.post.pk)
+        with self.assertNumQueries(0):
+            post = objects.posts.get(self.post.pk)
+            self.assertEqual(post.author.username, 'author')
+            self.assertEqual(post.group.slug, 'test-slug')
+        self.assertNotIn('password', post.author.__dict__)
+
+    def test_missing_row_cached_until_created(self):
+        self.assertIsNone(objects.groups.get('new'))
+        with self.assertNumQueries(0):
+            with self.assertRaises(Http404):
+                objects.groups.get_or_404('new')
+        group = Group.objects.create(title='Новая', slug='new')
+        self.assertEqual(objects.groups.get('new'), group)
+
+    def test_save_forgets_old_and_new_values(self):
+        objects.users.get('author')
+        objects.users.get('renamed')
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'renamed'
+        author.save()
+        self.assertIsNone(objects.users.get('author'))
+        self.assertEqual(objects.users.get('renamed'), author)
+        self.assertEqual(
+            objects.posts.get(self.post.pk).author.username, 'renamed'
+        )
+
+    def test_counter_and_delete_forget_post(self):
+        objects.posts.get(self.post.pk)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий'
+        )
+        self.assertEqual(objects.posts.get(self.post.pk).comments_count, 1)
+        Group.objects.get(pk=self.group.pk).delete()
+        self.assertIsNone(objects.posts.get(self.post.pk).group)
+        Post.objects.get(pk=self.post.pk).delete()
+        self.assertIsNone(objects.posts.get(self.post.pk))
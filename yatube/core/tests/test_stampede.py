@@ -0,0 +1,62 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from core import stampede
+
+
+class GetOrBuildTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        stampede.reset_metrics()
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return f'значение {self.builds}'
+
+    def test_hit_after_build(self):
+        self.assertEqual(
+            stampede.get_or_build('key', self.build, 60), 'значение 1'
+        )
+        self.assertEqual(
+            stampede.get_or_build('key', self.build, 60), 'значение 1'
+        )
+        self.assertEqual(self.builds, 1)
+        counts = stampede.metrics()
+        self.assertEqual((counts['miss'], counts['hit']), (1, 1))
+
+    def test_new_version_rebuilds(self):
+        stampede.get_or_build('key', self.build, 60, 'v1')
+        value = stampede.get_or_build('key', self.build, 60, 'v2')
+        self.assertEqual(value, 'значение 2')
+        self.assertEqual(
+            stampede.get_or_build('key', self.build, 60, 'v2'), 'значение 2'
+        )
+
+    def test_stale_value_served_while_locked(self):
+        stampede.get_or_build('key', self.build, 60, 'v1')
+        cache.add('lock:key', 1, stampede.LOCK_TIMEOUT)
+        value = stampede.get_or_build('key', self.build, 60, 'v2')
+        self.assertEqual(value, 'значение 1')
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(stampede.metrics()['stale'], 1)
+
+    def test_expiring_value_rebuilt_early(self):
+        stampede.get_or_build('key', self.build, 60)
+        with mock.patch('core.stampede.BETA', 10 ** 12), \
+                mock.patch('core.stampede.random.random', return_value=0.99):
+            value = stampede.get_or_build('key', self.build, 60)
+        self.assertEqual(value, 'значение 2')
+        self.assertEqual(stampede.metrics()['early'], 1)
+
+    def test_cachestats_command(self):
+        stampede.get_or_build('key', self.build, 60)
+        stampede.get_or_build('key', self.build, 60)
+        out = StringIO()
+        call_command('cachestats', '--reset', stdout=out)
+        self.assertIn('50.0%', out.getvalue())
+        self.assertEqual(stampede.metrics()['hit'], 0)
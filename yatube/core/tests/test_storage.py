@@ -0,0 +1,42 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.storage import (
+    ContentAddressedStorage, content_name, is_content_addressed,
+)
+
+
+class ContentAddressedStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_same_content_stored_once(self):
+        first = self.storage.save('posts/a.JPG', ContentFile(b'same'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'same'))
+        digest = hashlib.sha256(b'same').hexdigest()
+        self.assertEqual(first, f'posts/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(second, first)
+        self.assertTrue(is_content_addressed(first))
+        files = [
+            name for _, _, names in os.walk(self.location) for name in names
+        ]
+        self.assertEqual(files, [f'{digest}.jpg'])
+
+    def test_different_content_different_names(self):
+        first = self.storage.save('posts/a.jpg', ContentFile(b'one'))
+        second = self.storage.save('posts/a.jpg', ContentFile(b'two'))
+        self.assertNotEqual(first, second)
+        with self.storage.open(second) as file:
+            self.assertEqual(file.read(), b'two')
+
+    def test_content_name(self):
+        self.assertEqual(content_name('posts/x.png', 'ab' * 32),
+                         f'posts/ab/{"ab" * 32}.png')
+        self.assertFalse(is_content_addressed('posts/x.png'))
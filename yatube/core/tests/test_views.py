@@ -0,0 +1,63 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+
+from posts.models import Group
+
+User = get_user_model()
+
+
+class NotFoundTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_repeated_404_skips_database_and_template(self):
+        for url in ('/posts/999/', '/group/missing/', '/profile/missing/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+                self.assertTemplateUsed(response, 'core/404.html')
+                with self.assertNumQueries(0):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+                self.assertTemplateNotUsed(response, 'core/404.html')
+                self.assertContains(
+                    response, f'Страница {url} не найдена',
+                    status_code=HTTPStatus.NOT_FOUND,
+                )
+
+    def test_path_escaped(self):
+        self.client.get('/nonexist-page/')
+        response = self.client.get('/nonexist-<b>/')
+        self.assertContains(
+            response, 'Страница /nonexist-&lt;b&gt;/ не найдена',
+            status_code=HTTPStatus.NOT_FOUND,
+        )
+
+    def test_user_menu_punched_into_cached_body(self):
+        self.client.get('/posts/999/')
+        response = self.authorized_client.get('/posts/998/')
+        self.assertContains(
+            response, 'Пользователь: reader',
+            status_code=HTTPStatus.NOT_FOUND,
+        )
+        self.assertNotContains(
+            response, 'Регистрация', status_code=HTTPStatus.NOT_FOUND
+        )
+
+    def test_created_object_found_after_404(self):
+        url = '/group/new/'
+        self.assertEqual(
+            self.client.get(url).status_code, HTTPStatus.NOT_FOUND
+        )
+        Group.objects.create(title='Новая', slug='new')
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.OK)
@@ -0,0 +1,110 @@
+import threading
+
+from django.core.signals import request_started
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+_local = threading.local()
+
+
+def _prefetched():
+    if not hasattr(_local, 'values'):
+        _local.values = {}
+    return _local.values
+
+
+def forget(**kwargs):
+    _prefetched().clear()
+
+
+request_started.connect(forget)
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    """Хранилище метаданных миниатюр с пакетной предзагрузкой.
+
+    Значения, загруженные prefetch(), берутся из памяти потока до конца
+    запроса; остальные — как обычно, из кэша и базы.
+    """
+
+    def _get_raw(self, key):
+        values = _prefetched()
+        if key in values:
+            value = values[key]
+            return None if value == cached_db_kvstore.EMPTY_VALUE else value
+        return super()._get_raw(key)
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        _prefetched().pop(key, None)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        values = _prefetched()
+        for key in keys:
+            values.pop(key, None)
+
+
+def _thumbnail(file_, geometry, **options):
+    """ImageFile миниатюры, как его строит ThumbnailBackend."""
+    backend = default.backend
+    source = ImageFile(file_)
+    if settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def thumbnail_key(file_, geometry, **options):
+    """Ключ метаданных миниатюры, как его строит ThumbnailBackend."""
+    return add_prefix(_thumbnail(file_, geometry, **options).key)
+
+
+def ready(file_, geometry, **options):
+    """Готовая миниатюра file_ или None; сама миниатюра не создаётся."""
+    return default.kvstore.get(_thumbnail(file_, geometry, **options))
+
+
+def prefetch(files, geometry, **options):
+    """Загружает метаданные миниатюр files одним обращением к кэшу.
+
+    Чего нет в кэше, читается из базы одним запросом.
+    """
+    keys = [
+        thumbnail_key(file_, geometry, **options) for file_ in files if file_
+    ]
+    values = _prefetched()
+    keys = [key for key in keys if key not in values]
+    if not keys:
+        return
+    store = default.kvstore
+    found = store.cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        stored = dict(KVStoreModel.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        loaded = {
+            key: stored.get(key, cached_db_kvstore.EMPTY_VALUE)
+            for key in missing
+        }
+        store.cache.set_many(loaded, settings.THUMBNAIL_CACHE_TIMEOUT)
+        found.update(loaded)
+    values.update(found)
+
+
+def pregenerate(file_, geometries):
+    """Создаёт миниатюры file_ для каждой пары (geometry, options)."""
+    for geometry, options in geometries:
+        default.backend.get_thumbnail(file_, geometry, **options)
@@ -1,8 +1,40 @@
+from django.core.cache import cache
+from django.http import HttpResponseNotFound
 from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils.html import escape
+
+from core import holes
+from core.middleware import anonymous
+
+NOT_FOUND_TIMEOUT = 60 * 60
+# Вместо адреса в заготовку 404 рисуется метка; экранирование её не
+# меняет.
+PATH_MARKER = 'not-found-path-marker'
 
 
 def page_not_found(request, exception):
-    return render(request, 'core/404.html', {'path': request.path}, status=404)
+    """404 из заготовки: шаблон рисуется один раз для каждого view.
+
+    Заготовку сохраняет первый анонимный запрос. Адрес подставляется в
+    готовую разметку, меню вошедшего пользователя перерисовывается через
+    дырку, поэтому поток запросов к несуществующим адресам не стоит ни
+    отрисовки шаблона, ни обращений к базе.
+    """
+    match = request.resolver_match
+    key = f'not_found:{match.view_name if match else ""}'
+    body = cache.get(key)
+    if body is None:
+        body = render_to_string(
+            'core/404.html', {'path': PATH_MARKER}, request=request
+        )
+        if anonymous(request):
+            cache.set(key, body, NOT_FOUND_TIMEOUT)
+    elif not anonymous(request):
+        body = holes.punch(request, body)
+    return HttpResponseNotFound(
+        body.replace(PATH_MARKER, escape(request.path), 1)
+    )
 
 
 def csrf_failure(request, reason=''):
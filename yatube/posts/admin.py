@@ -1,33 +1,169 @@
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.forms import Select
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
 
-from .models import Group, Post, Comment, Follow
+from . import search
+from .models import Group, Post, Comment, Follow, User
+from .paginator import EstimatedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class FullTextSearchMixin:
+    """Поиск в списке по индексу FTS5 вместо LIKE по search_fields."""
+
+    search_index = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        match = search.match_query(search_term)
+        if match is None:
+            return queryset.none(), False
+        return queryset.filter(
+            pk__in=search.matching(self.search_index, match)
+        ), False
+
+
+class LargeTableMixin:
+    """Список, который не считает и не выбирает таблицу целиком."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр с полем ввода вместо списка всех значений.
+
+    Встроенный фильтр по внешнему ключу выводит в боковую панель каждую
+    строку связанной таблицы.
+    """
+
+    template = 'admin/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        # Непустой список, чтобы фильтр показывался.
+        return ((None, None),)
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(
+                remove=[self.parameter_name]
+            ),
+            'query_parts': [
+                (name, value) for name, value in changelist.params.items()
+                if name != self.parameter_name
+            ],
+        }
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value is None:
+            return queryset
+        return queryset.filter(**{self.parameter_name: self.clean(value)})
+
+    def clean(self, value):
+        return value
+
+
+class UsernameFilter(InputFilter):
+    """Фильтр по пользователю: имя заменяется на id до основного запроса."""
+
+    def clean(self, value):
+        return User.objects.filter(
+            username=value.strip()
+        ).values_list('pk', flat=True).first()
+
+
+class AuthorFilter(UsernameFilter):
+    title = 'Автор (username)'
+    parameter_name = 'author_id'
+
+
+class UserFilter(UsernameFilter):
+    title = 'Подписчик (username)'
+    parameter_name = 'user_id'
+
+
+class PostFilter(InputFilter):
+    title = 'Пост (id)'
+    parameter_name = 'post_id'
+
+    def clean(self, value):
+        try:
+            return int(value)
+        except ValueError:
+            raise IncorrectLookupParameters(f'Некорректный id поста: {value}')
+
+
+class ListSelect(Select):
+    """Select для строк списка без шаблонов виджета.
+
+    Шаблонный Select рендерит каждый вариант отдельным шаблоном; в
+    list_editable это сотни рендеров на странице.
+    """
+
+    def render(self, name, value, attrs=None, renderer=None):
+        value = '' if value is None else str(value)
+        options = format_html_join(
+            '', '<option value="{}"{}>{}</option>',
+            (
+                (key, ' selected' if str(key) == value else '', label)
+                for key, label in self.choices
+            ),
+        )
+        attrs = self.build_attrs(self.attrs, {**(attrs or {}), 'name': name})
+        return format_html('<select{}>{}</select>', flatatt(attrs), options)
+
+
+class PostAdmin(FullTextSearchMixin, LargeTableMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    search_index = search.POSTS
+    list_filter = ('pub_date', AuthorFilter)
+    autocomplete_fields = ('author',)
     empty_value_display = '-пусто-'
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'group':
+            kwargs.setdefault('widget', ListSelect)
+        formfield = super().formfield_for_foreignkey(
+            db_field, request, **kwargs
+        )
+        if db_field.name == 'group' and formfield is not None:
+            # Поле группы в каждой строке списка иначе перечитывает
+            # группы заново; список вариантов читается один раз.
+            formfield.choices = list(formfield.choices)
+        return formfield
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('title', 'slug', 'description',)
     list_filter = ('title',)
-    search_fields = ('text',)
+    search_fields = ('title', 'slug',)
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, LargeTableMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'author', 'post',)
-    list_filter = ('post',)
-    search_filter = ('text',)
+    list_select_related = ('author', 'post')
+    list_filter = (PostFilter, AuthorFilter)
+    search_fields = ('text',)
+    search_index = search.COMMENTS
+    autocomplete_fields = ('author', 'post')
+    ordering = ('-pk',)
     empty_value_display = '-пусто-'
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableMixin, admin.ModelAdmin):
     list_display = ('pk', 'author', 'user',)
-    list_filter = ('user',)
+    list_select_related = ('author', 'user')
+    list_filter = (UserFilter, AuthorFilter)
     search_filter = ('author',)
+    autocomplete_fields = ('author', 'user')
+    ordering = ('-pk',)
 
 
 admin.site.register(Post, PostAdmin)
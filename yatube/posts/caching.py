@@ -0,0 +1,170 @@
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+
+from core.cache import incr_many
+
+from .models import Follow, HotAuthor
+from .paginator import decode_cursor
+from .timeline import readers
+
+GLOBAL = 'global'
+GROUP = 'group'
+AUTHOR = 'author'
+FOLLOWER = 'follower'
+PROFILE = 'profile'
+
+
+def generation_key(scope, pk=None):
+    return f'gen:{scope}:{pk}'
+
+
+def list_key(scope, pk=None):
+    return f'lgen:{scope}:{pk}'
+
+
+def modified_key(scope, pk=None):
+    return f'mod:{scope}:{pk}'
+
+
+def _initial():
+    # Поколение стартует с текущего времени в миллисекундах, а не с
+    # единицы: после вытеснения ключа старые фрагменты не оживут.
+    return int(time.time() * 1000)
+
+
+def generations(*scopes):
+    """Текущие поколения для пар (scope, pk) в том же порядке."""
+    return _current([generation_key(scope, pk) for scope, pk in scopes])
+
+
+def _current(keys):
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            initial = _initial()
+            cache.add(key, initial, None)
+            found[key] = cache.get(key, initial)
+    return [found[key] for key in keys]
+
+
+def modified(*scopes):
+    """Время последнего изменения любой из областей.
+
+    Если отметка вытеснена из кэша, область считается изменённой сейчас.
+    """
+    keys = [modified_key(scope, pk) for scope, pk in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            now = time.time()
+            cache.add(key, now, None)
+            found[key] = cache.get(key, now)
+    latest = max(found.values(), default=0)
+    return datetime.fromtimestamp(latest, timezone.utc)
+
+
+def bump(*scopes, lists=True):
+    """Отмечает изменение областей.
+
+    lists=False — правка, которая не меняет состав и порядок лент,
+    например текста поста: страницы перерисовываются, а списки id
+    постов в кэше остаются.
+    """
+    now = time.time()
+    cache.set_many(
+        {modified_key(scope, pk): now for scope, pk in scopes}, None
+    )
+    keys = [generation_key(scope, pk) for scope, pk in scopes]
+    if lists:
+        keys += [list_key(scope, pk) for scope, pk in scopes]
+    # У популярного автора это тысячи ключей: они увеличиваются одной
+    # транзакцией. Вытесненные заводятся заново, тоже одной записью.
+    found = incr_many(cache, keys)
+    initial = _initial()
+    missing = {key: initial for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+
+
+def page_cache(request, name, *scopes):
+    """Ключ и версии кэша страницы ленты.
+
+    Ключ — лента и позиция в ней. Версия разметки — поколения её
+    областей, версия списка id — поколения состава лент: после правки
+    поста разметка пересобирается, а список id нет. После записи старое
+    значение ещё отдаётся, пока его пересобирают.
+    """
+    cursor = request.GET.get('cursor')
+    if cursor and decode_cursor(cursor):
+        position = cursor
+    else:
+        try:
+            position = str(max(int(request.GET.get('page')), 1))
+        except (TypeError, ValueError):
+            position = '1'
+    values = _current(
+        [generation_key(scope, pk) for scope, pk in scopes]
+        + [list_key(scope, pk) for scope, pk in scopes]
+    )
+    version = '.'.join(str(value) for value in values[:len(scopes)])
+    ids_version = '.'.join(str(value) for value in values[len(scopes):])
+    return f'{name}:{position}', version, ids_version
+
+
+def post_scopes(post, group_ids=(), user_ids=None):
+    """Области, в которых показывается пост.
+
+    group_ids — дополнительные группы, например прежняя группа
+    отредактированного поста; user_ids — уже прочитанный
+    timeline.readers автора.
+    """
+    scopes = [(GLOBAL, None), (AUTHOR, post.author_id)]
+    for group_id in {post.group_id, *group_ids}:
+        if group_id is not None:
+            scopes.append((GROUP, group_id))
+    if user_ids is None:
+        user_ids = readers(post.author_id)
+    scopes.extend((FOLLOWER, user_id) for user_id in user_ids)
+    return scopes
+
+
+def shown_in(posts):
+    """Области, в разметке которых есть посты выборки posts.
+
+    Нужны, когда меняется то, что карточка берёт у автора или группы:
+    имя автора, slug группы.
+    """
+    rows = set(posts.order_by().values_list('author_id', 'group_id'))
+    authors = {author_id for author_id, _ in rows}
+    scopes = [(GLOBAL, None)]
+    scopes.extend((AUTHOR, author_id) for author_id in authors)
+    scopes.extend(
+        (GROUP, group_id) for group_id in {group_id for _, group_id in rows}
+        if group_id is not None
+    )
+    # Посты популярных авторов лента подписок берёт из области AUTHOR.
+    hot = HotAuthor.objects.filter(
+        author_id__in=authors
+    ).values_list('author_id', flat=True)
+    followers = Follow.objects.filter(
+        author_id__in=authors - set(hot)
+    ).order_by().values_list('user_id', flat=True).distinct()
+    scopes.extend((FOLLOWER, user_id) for user_id in followers)
+    return scopes
+
+
+def follow_scopes(user, hot_authors):
+    return [(FOLLOWER, user.pk)] + [
+        (AUTHOR, author_id) for author_id in hot_authors
+    ]
+
+
+def follow_write_scopes(follow):
+    """Области, которые меняет подписка: лента и счётчики профилей."""
+    return [
+        (FOLLOWER, follow.user_id),
+        (PROFILE, follow.user_id),
+        (PROFILE, follow.author_id),
+    ]
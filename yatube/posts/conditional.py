@@ -0,0 +1,156 @@
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from django.db.models import OuterRef, Subquery
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+    quote_etag,
+)
+from django.utils.http import http_date
+
+from core.middleware import depend
+
+from . import caching, objects
+from .caching import AUTHOR, GLOBAL, GROUP, PROFILE
+from .models import Comment, Group, Post, User
+from .paginator import CursorPaginator
+from .timeline import follow_sources, hot_authors
+
+
+def conditional(state):
+    """Условный GET для страниц лент и постов.
+
+    state(request, *args, **kwargs) возвращает (parts, last_modified)
+    или None, если страницы нет. Из parts строится ETag; совпадение с
+    If-None-Match или If-Modified-Since даёт 304 без вызова view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            found = state(request, *args, **kwargs)
+            if found is None:
+                return view(request, *args, **kwargs)
+            parts, last_modified = found
+            etag = quote_etag(fingerprint(request, parts))
+            timestamp = timegm(last_modified.utctimetuple())
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp
+            )
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                if not response.has_header('ETag'):
+                    response['ETag'] = etag
+                if not response.has_header('Last-Modified'):
+                    response['Last-Modified'] = http_date(timestamp)
+                patch_vary_headers(response, ('Cookie',))
+                patch_cache_control(response, no_cache=True)
+            return response
+        return inner
+    return decorator
+
+
+def fingerprint(request, parts):
+    # Страница зависит ещё от адреса, пользователя в шапке и CSRF-токена
+    # формы комментария.
+    raw = repr((
+        request.get_full_path(),
+        request.user.pk,
+        request.META.get('CSRF_COOKIE'),
+        parts,
+    ))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _newest(queryset, *fields):
+    """Самый новый пост выборки: (pub_date, id, *fields) или None.
+
+    ORDER BY ... LIMIT 1 читает одну строку индекса вместо подсчёта.
+    """
+    return queryset.order_by('-pub_date', '-id').values_list(
+        'pub_date', 'id', *fields
+    ).first()
+
+
+def _state(request, scopes, newest):
+    generations = caching.generations(*scopes)
+    depend(request, {
+        caching.generation_key(scope, pk): generation
+        for (scope, pk), generation in zip(scopes, generations)
+    })
+    last_modified = caching.modified(*scopes)
+    if newest is not None:
+        last_modified = max(last_modified, newest[0])
+    return (generations, newest), last_modified
+
+
+def index_state(request):
+    return _state(request, [(GLOBAL, None)], _newest(Post.objects.all()))
+
+
+def group_state(request, slug):
+    if objects.groups.missing(slug):
+        return None
+    newest = _newest(Post.objects.filter(group__slug=slug), 'group_id')
+    if newest is not None:
+        group_id = newest[2]
+    else:
+        group_id = Group.objects.filter(
+            slug=slug
+        ).values_list('pk', flat=True).first()
+        if group_id is None:
+            return None
+    return _state(request, [(GROUP, group_id)], newest)
+
+
+def profile_state(request, username):
+    if objects.users.missing(username):
+        return None
+    newest = _newest(
+        Post.objects.filter(author__username=username), 'author_id'
+    )
+    if newest is not None:
+        author_id = newest[2]
+    else:
+        author_id = User.objects.filter(
+            username=username
+        ).values_list('pk', flat=True).first()
+        if author_id is None:
+            return None
+    scopes = [(AUTHOR, author_id), (PROFILE, author_id)]
+    return _state(request, scopes, newest)
+
+
+def post_state(request, post_id):
+    if objects.posts.missing(post_id):
+        return None
+    last_comment = Comment.objects.filter(
+        post=OuterRef('pk')
+    ).order_by('-pub_date', '-id').values('id')[:1]
+    post = Post.objects.filter(pk=post_id).annotate(
+        last_comment=Subquery(last_comment)
+    ).values_list(
+        'pub_date', 'id', 'author_id', 'group_id', 'comments_count',
+        'last_comment',
+    ).first()
+    if post is None:
+        return None
+    author_id, group_id = post[2], post[3]
+    scopes = [(AUTHOR, author_id)]
+    if group_id is not None:
+        scopes.append((GROUP, group_id))
+    return _state(request, scopes, post)
+
+
+def follow_state(request):
+    hot_author_ids = hot_authors(request.user)
+    newest = CursorPaginator(
+        follow_sources(request.user, hot_author_ids), 1
+    ).newest()
+    return _state(
+        request,
+        caching.follow_scopes(request.user, hot_author_ids), newest
+    )
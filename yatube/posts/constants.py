@@ -1 +1,22 @@
 CONST1 = '10'
+FANOUT_LIMIT = 1000
+PAGE_CACHE_TIMEOUT = 600
+COMMENTS_PER_PAGE = 20
+ESTIMATE_THRESHOLD = 10000
+# Самая дальняя страница ?page=N ленты, слитой из нескольких источников:
+# дальше листают курсоры.
+MAX_OFFSET_PAGE = 50
+# Миниатюры, которые показывают шаблоны: геометрия и параметры тега
+# thumbnail. Их заранее создаёт фоновая задача после загрузки картинки.
+THUMBNAIL_GEOMETRIES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# Ширины перекодированных вариантов картинки поста для srcset; пропорции
+# те же, что у миниатюры 960x339.
+VARIANT_WIDTHS = (480, 960, 1440)
+VARIANT_ASPECT = (960, 339)
+VARIANT_SIZES = '(max-width: 960px) 100vw, 960px'
+# Сколько слов текста поста показывает карточка в лентах.
+EXCERPT_WORDS = 30
+# Сколько хранится отрисованная карточка поста; ключ меняется при правке.
+CARD_CACHE_TIMEOUT = 24 * 60 * 60
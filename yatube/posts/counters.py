@@ -0,0 +1,136 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import objects
+from .models import Blob, Comment, Follow, Post, User, UserStats
+
+BATCH_SIZE = 1000
+
+
+def user_counts(user_id):
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def change_user(user_id, **deltas):
+    """Сдвигает счётчики пользователя на deltas одним UPDATE.
+
+    Строки ещё нет — она создаётся с посчитанными заново значениями,
+    но только при росте счётчиков: при каскадном удалении пользователя
+    его строка могла уже исчезнуть.
+    """
+    updated = UserStats.objects.filter(user_id=user_id).update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        UserStats.objects.get_or_create(
+            user_id=user_id, defaults=user_counts(user_id)
+        )
+
+
+def change_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def stats_for(user):
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        stats, _ = UserStats.objects.get_or_create(
+            user=user, defaults=user_counts(user.pk)
+        )
+        return stats
+
+
+def followers_count(user_id):
+    count = UserStats.objects.filter(user_id=user_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    if count is None:
+        return Follow.objects.filter(author_id=user_id).count()
+    return count
+
+
+def _count(model, field, outer='pk'):
+    rows = model.objects.filter(
+        **{field: OuterRef(outer)}
+    ).order_by().values(field).annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def _fix(queryset, fields, dry_run):
+    fixed, batch = 0, []
+    for row in queryset.iterator():
+        for field in fields:
+            setattr(row, field, getattr(row, f'actual_{field}'))
+        batch.append(row)
+        fixed += 1
+        if len(batch) == BATCH_SIZE and not dry_run:
+            queryset.model.objects.bulk_update(batch, fields)
+            batch = []
+    if batch and not dry_run:
+        queryset.model.objects.bulk_update(batch, fields)
+    return fixed
+
+
+def reconcile_users(dry_run=False):
+    """Пересчитывает счётчики пользователей, возвращает число исправленных."""
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True
+    )
+    if not dry_run:
+        UserStats.objects.bulk_create(
+            [UserStats(user_id=pk) for pk in missing],
+            batch_size=BATCH_SIZE,
+        )
+    drifted = UserStats.objects.annotate(
+        actual_posts_count=_count(Post, 'author', 'user'),
+        actual_followers_count=_count(Follow, 'author', 'user'),
+        actual_following_count=_count(Follow, 'user', 'user'),
+    ).exclude(
+        posts_count=F('actual_posts_count'),
+        followers_count=F('actual_followers_count'),
+        following_count=F('actual_following_count'),
+    )
+    return _fix(
+        drifted,
+        ('posts_count', 'followers_count', 'following_count'),
+        dry_run
+    )
+
+
+def reconcile_posts(dry_run=False):
+    """Пересчитывает счётчики комментариев, возвращает число исправленных."""
+    drifted = Post.objects.annotate(
+        actual_comments_count=_count(Comment, 'post'),
+    ).exclude(comments_count=F('actual_comments_count'))
+    pks = list(drifted.values_list('pk', flat=True))
+    fixed = _fix(drifted, ('comments_count',), dry_run)
+    if not dry_run:
+        # bulk_update не шлёт сигналов: записи кэша сбрасываются здесь.
+        objects.forget_posts(*pks)
+    return fixed
+
+
+def reconcile_blobs(dry_run=False):
+    """Пересчитывает ссылки на файлы картинок, возвращает число исправленных.
+
+    Файлы без строки в Blob получают её; файлы без ссылок не удаляются.
+    """
+    named = Blob.objects.values_list('name', flat=True)
+    missing = Post.objects.exclude(image='').exclude(
+        image__in=named
+    ).order_by().values_list('image', flat=True).distinct()
+    if not dry_run:
+        Blob.objects.bulk_create(
+            [Blob(name=name) for name in missing], batch_size=BATCH_SIZE
+        )
+    drifted = Blob.objects.annotate(
+        actual_refs=_count(Post, 'image', 'name'),
+    ).exclude(refs=F('actual_refs'))
+    return _fix(drifted, ('refs',), dry_run)
@@ -0,0 +1,33 @@
+from django.utils.html import linebreaks
+from django.utils.text import Truncator
+
+from .constants import EXCERPT_WORDS
+
+BATCH_SIZE = 1000
+
+
+def excerpt_html(text):
+    """HTML анонса, как text|truncatewords:30|linebreaks в шаблоне."""
+    return linebreaks(
+        Truncator(text).words(EXCERPT_WORDS, truncate=' …'), autoescape=True
+    )
+
+
+def backfill(model, batch_size=BATCH_SIZE, only_missing=True):
+    """Заполняет анонсы постов пачками по id; возвращает число постов.
+
+    model передаётся, чтобы функцию могла вызвать и миграция.
+    """
+    queryset = model.objects.order_by('pk').only('pk', 'text')
+    if only_missing:
+        queryset = queryset.filter(excerpt='')
+    last, total = 0, 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last)[:batch_size])
+        if not batch:
+            return total
+        for post in batch:
+            post.excerpt = excerpt_html(post.text)
+        model.objects.bulk_update(batch, ['excerpt'])
+        last = batch[-1].pk
+        total += len(batch)
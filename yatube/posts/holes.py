@@ -0,0 +1,29 @@
+from core.holes import register
+
+from .forms import CommentForm
+from .models import Follow
+
+
+@register('follow_button', 'posts/includes/follow_button.html')
+def follow_button(request, username):
+    user = request.user
+    following = user.is_authenticated and Follow.objects.filter(
+        user=user, author__username=username
+    ).exists()
+    return {'username': username, 'following': following}
+
+
+@register('comment_form', 'posts/includes/comment_form.html')
+def comment_form(request, post_id):
+    return {'post_id': post_id, 'form': CommentForm()}
+
+
+@register('edit_link', 'posts/includes/edit_link.html')
+def edit_link(request, post_id, author_id):
+    return {'post_id': post_id, 'author_id': author_id}
+
+
+@register('switcher', 'posts/includes/switcher.html')
+def switcher(request, active):
+    # Вкладки видны только вошедшим: в кэше страницы анонима их нет.
+    return {active: True}
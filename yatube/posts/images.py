@@ -0,0 +1,228 @@
+import io
+import os
+from collections import namedtuple
+from operator import attrgetter
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from PIL import Image, ImageOps, features
+from sorl import thumbnail
+
+from core import background
+from core.thumbnails import pregenerate
+
+from .constants import (
+    THUMBNAIL_GEOMETRIES, VARIANT_ASPECT, VARIANT_SIZES, VARIANT_WIDTHS,
+)
+from .models import Blob, ImageVariant, Post
+
+Format = namedtuple('Format', 'name mime pil options')
+Picture = namedtuple('Picture', 'sources src srcset sizes width height')
+
+# От самого компактного к запасному: браузер берёт первый <source>,
+# который понимает, а JPEG в <img> понимают все.
+FORMATS = (
+    Format('avif', 'image/avif', 'AVIF', {'quality': 55}),
+    Format('webp', 'image/webp', 'WEBP', {'quality': 80, 'method': 6}),
+    Format('jpeg', 'image/jpeg', 'JPEG', {
+        'quality': 82, 'optimize': True, 'progressive': True,
+    }),
+)
+FALLBACK = 'jpeg'
+
+
+def image_storage():
+    return Post._meta.get_field('image').storage
+
+
+def available_formats():
+    """Форматы, которые умеет кодировать установленный Pillow."""
+    Image.init()
+    supported = {
+        'AVIF': 'AVIF' in Image.SAVE,
+        'WEBP': features.check('webp'),
+        'JPEG': True,
+    }
+    return [item for item in FORMATS if supported[item.pil]]
+
+
+def variant_widths(source_width):
+    """Ширины вариантов: без увеличения, но хотя бы одна."""
+    widths = [width for width in VARIANT_WIDTHS if width <= source_width]
+    return widths or VARIANT_WIDTHS[:1]
+
+
+def variant_height(width):
+    return round(width * VARIANT_ASPECT[1] / VARIANT_ASPECT[0])
+
+
+def open_source(name):
+    """Картинка из хранилища: по EXIF повёрнута, в RGB."""
+    with image_storage().open(name) as file:
+        image = Image.open(file)
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+    return image, icc_profile
+
+
+def encode(image, format_, icc_profile):
+    # EXIF не передаётся: в варианты не попадают ни координаты, ни модель
+    # камеры, а ориентация уже применена к пикселям.
+    options = dict(format_.options)
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    buffer = io.BytesIO()
+    image.save(buffer, format_.pil, **options)
+    return buffer.getvalue()
+
+
+def complete(existing, formats, widths):
+    return bool(widths) and all(
+        (item.name, width) in existing for item in formats for width in widths
+    )
+
+
+def build_variants(name):
+    """Создаёт недостающие варианты картинки name во всех форматах.
+
+    Повторный вызов ничего не перекодирует; возвращает число новых файлов.
+    """
+    formats = available_formats()
+    existing = set(ImageVariant.objects.filter(
+        source=name
+    ).values_list('format', 'width'))
+    if complete(existing, formats, {width for _, width in existing}):
+        # Файл с тем же содержимым уже обработан для другого поста.
+        return 0
+    image, icc_profile = open_source(name)
+    widths = variant_widths(image.width)
+    if complete(existing, formats, widths):
+        return 0
+    stem = os.path.splitext(name)[0]
+    created = 0
+    for width in widths:
+        height = variant_height(width)
+        resized = ImageOps.fit(
+            image, (width, height), Image.LANCZOS, centering=(0.5, 0.5)
+        )
+        for format_ in formats:
+            if (format_.name, width) in existing:
+                continue
+            # Имя выводится из имени исходника, то есть из хэша его
+            # содержимого: готовый файл с таким именем — тот же вариант.
+            # Его берём как есть, а не сохраняем копию с суффиксом.
+            target = f'variants/{stem}_{width}.{format_.name}'
+            path = target
+            if not default_storage.exists(target):
+                path = default_storage.save(
+                    target,
+                    ContentFile(encode(resized, format_, icc_profile)),
+                )
+            try:
+                with transaction.atomic():
+                    ImageVariant.objects.create(
+                        source=name, format=format_.name, width=width,
+                        height=height, file=path,
+                    )
+            except IntegrityError:
+                # Тот же вариант успела создать параллельная задача; её
+                # файл не трогаем, лишнюю копию с суффиксом удаляем.
+                if path != target:
+                    default_storage.delete(path)
+                continue
+            created += 1
+    return created
+
+
+def pictures(names):
+    """Picture для каждой картинки из names, у которой есть варианты.
+
+    Один запрос на все картинки страницы. Варианты сортируются по ширине
+    здесь, а не в базе: индекс по (source, format, width) не упорядочивает
+    выборку по нескольким source, и ORDER BY строил бы временное дерево.
+    """
+    grouped = {}
+    variants = ImageVariant.objects.filter(
+        source__in=set(filter(None, names))
+    )
+    for variant in sorted(variants, key=attrgetter('width')):
+        grouped.setdefault(variant.source, {}).setdefault(
+            variant.format, []
+        ).append(variant)
+    found = {}
+    for name, by_format in grouped.items():
+        fallback = by_format.get(FALLBACK)
+        if not fallback:
+            continue
+        sources = [
+            (item.mime, srcset(by_format[item.name]))
+            for item in FORMATS
+            if item.name != FALLBACK and item.name in by_format
+        ]
+        # Атрибуты width и height задают пропорции до загрузки, src —
+        # вариант для тех, кто не понимает srcset.
+        default = [
+            variant for variant in fallback
+            if variant.width <= VARIANT_ASPECT[0]
+        ][-1:] or fallback[:1]
+        found[name] = Picture(
+            sources=sources,
+            src=default[0].file.url,
+            srcset=srcset(fallback),
+            sizes=VARIANT_SIZES,
+            width=default[0].width,
+            height=default[0].height,
+        )
+    return found
+
+
+def srcset(variants):
+    return ', '.join(
+        f'{variant.file.url} {variant.width}w' for variant in variants
+    )
+
+
+def prepare_image(post_id):
+    """Миниатюры и варианты картинки поста для шаблонов."""
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if post is not None and post.image:
+        pregenerate(post.image, THUMBNAIL_GEOMETRIES)
+        build_variants(post.image.name)
+
+
+def retain(name):
+    """Ещё один пост ссылается на файл name."""
+    updated = Blob.objects.filter(name=name).update(refs=F('refs') + 1)
+    if not updated:
+        Blob.objects.get_or_create(
+            name=name,
+            defaults={'refs': Post.objects.filter(image=name).count()},
+        )
+
+
+def release(name):
+    """Пост больше не ссылается на name; последняя ссылка удаляет файл."""
+    Blob.objects.filter(name=name).update(refs=F('refs') - 1)
+    background.defer(collect, name)
+
+
+def collect(name):
+    """Удаляет файл без ссылок вместе с миниатюрами и вариантами.
+
+    Счётчик перепроверяется по постам: пока задача ждала, тот же файл
+    могли загрузить снова.
+    """
+    if Post.objects.filter(image=name).exists():
+        return
+    deleted, _ = Blob.objects.filter(name=name, refs__lte=0).delete()
+    if not deleted:
+        return
+    variants = ImageVariant.objects.filter(source=name)
+    for variant in variants:
+        variant.file.delete(save=False)
+    variants.delete()
+    thumbnail.delete(Post(image=name).image)
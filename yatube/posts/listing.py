@@ -0,0 +1,35 @@
+from .models import Post
+
+# Столбцы, которые нужны карточке поста в лентах.
+CARD_FIELDS = (
+    'pub_date',
+    'updated',
+    'excerpt',
+    'image',
+    'comments_count',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group__slug',
+)
+
+
+def card_fields(prefix=''):
+    return [f'{prefix}{field}' for field in CARD_FIELDS]
+
+
+def card_columns():
+    """Столбцы самого поста для карточки: автор и группа — по id."""
+    own = [field for field in CARD_FIELDS if '__' not in field]
+    return own + ['author', 'group']
+
+
+def post_listing(queryset=None):
+    """Посты для карточек лент: автор и группа одним запросом.
+
+    Из таблиц читаются только столбцы CARD_FIELDS; метаданные миниатюр
+    страницы подгружает тег prefetch_pictures.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    return queryset.select_related('author', 'group').only(*card_fields())
@@ -0,0 +1,25 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from posts.excerpts import BATCH_SIZE, backfill
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Заполняет анонсы постов, у которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать анонсы всех постов',
+        )
+
+    def handle(self, *args, **options):
+        total = backfill(
+            Post, options['batch_size'], only_missing=not options['all']
+        )
+        if total:
+            # Карточки в кэше отрисованы со старыми анонсами.
+            cache.clear()
+        self.stdout.write(f'Анонсов заполнено: {total}')
@@ -0,0 +1,369 @@
+import copy
+import io
+import json
+import os
+import logging
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+from wsgiref.util import setup_testing_defaults
+
+import django
+from django.conf import settings
+from django.core import signals
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.querybudget import QueryStats
+from posts.models import Post, User, UserStats
+from yatube.wsgi import application
+
+METRICS = ('p50', 'p95', 'p99', 'queries', 'alloc_kib')
+FORM = 'application/x-www-form-urlencoded'
+DUMMY_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+Scenario = namedtuple('Scenario', 'name login expect request')
+Targets = namedtuple('Targets', 'posts groups authors readers')
+
+
+def pick(items, i):
+    return items[i % len(items)]
+
+
+SCENARIOS = (
+    Scenario('index', False, 200, lambda targets, i: (
+        'GET', reverse('posts:index'), None
+    )),
+    Scenario('group_posts', False, 200, lambda targets, i: (
+        'GET', reverse('posts:group_list', args=[pick(targets.groups, i)]),
+        None,
+    )),
+    Scenario('profile', False, 200, lambda targets, i: (
+        'GET', reverse('posts:profile', args=[pick(targets.authors, i)]),
+        None,
+    )),
+    Scenario('post_detail', False, 200, lambda targets, i: (
+        'GET', reverse('posts:post_detail', args=[pick(targets.posts, i)]),
+        None,
+    )),
+    Scenario('follow_index', True, 200, lambda targets, i: (
+        'GET', reverse('posts:follow_index'), None
+    )),
+    Scenario('post_create', True, 302, lambda targets, i: (
+        'POST', reverse('posts:post_create'),
+        {'text': f'Пост бенчмарка {i}'},
+    )),
+    Scenario('add_comment', True, 302, lambda targets, i: (
+        'POST', reverse('posts:add_comment', args=[pick(targets.posts, i)]),
+        {'text': f'Комментарий бенчмарка {i}'},
+    )),
+)
+
+
+def percentile(samples, q):
+    """q-й процентиль выборки, с интерполяцией между соседями."""
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+@contextmanager
+def quiet(name):
+    """Отключает предупреждения логгера: запросы считает сам бенчмарк."""
+    logger = logging.getLogger(name)
+    level = logger.level
+    logger.setLevel(logging.ERROR)
+    try:
+        yield
+    finally:
+        logger.setLevel(level)
+
+
+def regressions(results, baseline, threshold):
+    """Метрики, которые выросли относительно baseline больше порога."""
+    found = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in METRICS:
+            before, after = previous.get(metric), current[metric]
+            if before is not None and after > before * (1 + threshold):
+                found.append((name, metric, before, after))
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет основные страницы через WSGI-приложение на заполненной '
+        'базе и сохраняет задержки, число запросов и аллокации'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument(
+            '--alloc-samples', type=int, default=20,
+            help='Сколько запросов сценария прогнать под tracemalloc',
+        )
+        parser.add_argument(
+            '--targets', type=int, default=10,
+            help='Сколько разных постов, групп и авторов обходить',
+        )
+        parser.add_argument(
+            '--no-cache', action='store_true',
+            help='Отключить кэш, чтобы мерить сами view и их запросы',
+        )
+        parser.add_argument('--only', nargs='+', metavar='SCENARIO')
+        parser.add_argument('--output', help='Куда сохранить результаты')
+        parser.add_argument('--baseline', help='Результаты для сравнения')
+        parser.add_argument(
+            '--threshold', type=float, default=0.3,
+            help='Допустимый рост метрики относительно baseline, доля',
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError('Нужно хотя бы две итерации')
+        self.options = options
+        self.mode = 'no-cache' if options['no_cache'] else 'cache'
+        scenarios = self.scenarios(options['only'])
+        baseline = self.baseline(options['baseline'])
+        targets = self.targets(options['targets'])
+
+        # Отдельный кэш, чтобы страницы с откатываемыми записями не
+        # попали в общий. Соединение с базой не закрывается между
+        # запросами, как в тестовом клиенте, иначе транзакция оборвётся.
+        signals.request_started.disconnect(close_old_connections)
+        signals.request_finished.disconnect(close_old_connections)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                overrides = override_settings(
+                    DEBUG=False, CACHES=self.caches(directory)
+                )
+                with overrides, quiet('core.middleware'), \
+                        transaction.atomic():
+                    results = {
+                        scenario.name: self.run(scenario, targets)
+                        for scenario in scenarios
+                    }
+                    transaction.set_rollback(True)
+        finally:
+            signals.request_started.connect(close_old_connections)
+            signals.request_finished.connect(close_old_connections)
+
+        self.report(results, baseline)
+        if options['output']:
+            self.save(options['output'], results)
+        if baseline is not None:
+            found = regressions(results, baseline, options['threshold'])
+            for name, metric, before, after in found:
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: {metric} {before:.2f} -> {after:.2f}'
+                ))
+            if found:
+                raise CommandError(f'Регрессий: {len(found)}')
+
+    def scenarios(self, only):
+        if not only:
+            return SCENARIOS
+        unknown = set(only) - {scenario.name for scenario in SCENARIOS}
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}'
+            )
+        return [scenario for scenario in SCENARIOS if scenario.name in only]
+
+    def baseline(self, path):
+        if not path:
+            return None
+        with open(path, encoding='utf-8') as file:
+            saved = json.load(file)
+        mode = saved['meta'].get('mode')
+        if mode != self.mode:
+            raise CommandError(
+                f'Базовый прогон сделан в режиме {mode}, текущий — {self.mode}'
+            )
+        return saved['results']
+
+    def caches(self, directory):
+        if self.options['no_cache']:
+            return DUMMY_CACHE
+        # Те же параметры, что у рабочего кэша, иначе при MAX_ENTRIES по
+        # умолчанию страницы вытесняют друг друга; меняется только файл.
+        default = copy.deepcopy(settings.CACHES['default'])
+        default['LOCATION'] = os.path.join(directory, 'cache.sqlite3')
+        return {'default': default}
+
+    def save(self, path, results):
+        meta = {
+            'created': timezone.now().isoformat(),
+            'mode': self.mode,
+            'iterations': self.options['iterations'],
+            'warmup': self.options['warmup'],
+            'posts': Post.objects.count(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        }
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(
+                {'meta': meta, 'results': results},
+                file, ensure_ascii=False, indent=2,
+            )
+
+    def targets(self, count):
+        recent = list(
+            Post.objects.select_related('author', 'group')
+            .order_by('-pub_date', '-id')[:count * 5]
+        )
+        groups = list(dict.fromkeys(
+            post.group.slug for post in recent if post.group_id
+        ))[:count]
+        # Самые подписанные читатели: у них самая тяжёлая лента.
+        readers = list(
+            UserStats.objects.filter(following_count__gt=0)
+            .order_by('-following_count')
+            .values_list('user_id', flat=True)[:count]
+        )
+        if not groups or not readers:
+            raise CommandError(
+                'Нужны посты с группами и подписки: manage.py seed'
+            )
+        return Targets(
+            posts=[post.pk for post in recent[:count]],
+            groups=groups,
+            authors=list(dict.fromkeys(
+                post.author.username for post in recent
+            ))[:count],
+            readers=readers,
+        )
+
+    def sessions(self, readers):
+        """Cookie сессии и CSRF-токен для каждого читателя."""
+        cookies = []
+        for user in User.objects.filter(pk__in=readers):
+            client = Client()
+            client.force_login(user)
+            jar = {name: morsel.value for name, morsel in
+                   client.cookies.items()}
+            self.request('GET', reverse('posts:post_create'), None, jar)
+            cookies.append(jar)
+        return cookies
+
+    def request(self, method, url, data, jar):
+        """Один запрос через WSGI-приложение; возвращает код ответа."""
+        parts = urlsplit(url)
+        body = urlencode(data).encode() if data else b''
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': parts.path,
+            'QUERY_STRING': parts.query,
+            'CONTENT_TYPE': FORM,
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body),
+        }
+        if jar:
+            environ['HTTP_COOKIE'] = '; '.join(
+                f'{name}={value}' for name, value in jar.items()
+            )
+            environ['HTTP_X_CSRFTOKEN'] = jar.get('csrftoken', '')
+        setup_testing_defaults(environ)
+        status = []
+
+        def start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split()[0]))
+            for name, value in headers:
+                if jar is not None and name == 'Set-Cookie':
+                    for key, morsel in SimpleCookie(value).items():
+                        jar[key] = morsel.value
+
+        response = application(environ, start_response)
+        try:
+            b''.join(response)
+        finally:
+            response.close()
+        return status[0]
+
+    def run(self, scenario, targets):
+        options = self.options
+        jars = self.sessions(targets.readers) if scenario.login else [None]
+        latencies = []
+        stats = QueryStats()
+        total = options['warmup'] + options['iterations']
+        for i in range(total):
+            method, url, data = scenario.request(targets, i)
+            jar = pick(jars, i)
+            measured = i >= options['warmup']
+            started = time.perf_counter()
+            wrapper = (
+                connection.execute_wrapper(stats) if measured
+                else nullcontext()
+            )
+            with wrapper:
+                status = self.request(method, url, data, jar)
+            elapsed = time.perf_counter() - started
+            if status != scenario.expect:
+                raise CommandError(
+                    f'{scenario.name}: {method} {url} вернул {status}'
+                )
+            if measured:
+                latencies.append(elapsed * 1000)
+
+        peaks = []
+        for i in range(total, total + options['alloc_samples']):
+            method, url, data = scenario.request(targets, i)
+            # Пик считается заново с каждого start(): reset_peak() есть
+            # только с Python 3.9.
+            tracemalloc.start()
+            try:
+                self.request(method, url, data, pick(jars, i))
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            peaks.append(peak / 1024)
+
+        return {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'mean': statistics.mean(latencies),
+            'queries': stats.count / options['iterations'],
+            'alloc_kib': statistics.median(peaks) if peaks else 0,
+            'requests': options['iterations'],
+        }
+
+    def report(self, results, baseline):
+        header = ('scenario', 'p50 ms', 'p95 ms', 'p99 ms', 'queries',
+                  'alloc KiB')
+        self.stdout.write(
+            f'{header[0]:<14}' + ''.join(f'{title:>11}' for title in
+                                         header[1:])
+        )
+        for name, result in results.items():
+            cells = [f'{result[metric]:.1f}' for metric in METRICS]
+            self.stdout.write(
+                f'{name:<14}' + ''.join(f'{cell:>11}' for cell in cells)
+            )
+            previous = (baseline or {}).get(name)
+            if previous:
+                changes = [
+                    f'{(result[metric] / previous[metric] - 1):+.0%}'
+                    if previous.get(metric) else '—'
+                    for metric in METRICS
+                ]
+                self.stdout.write(
+                    f'{"":<14}' + ''.join(f'{cell:>11}' for cell in changes)
+                )
@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+
+from core.storage import is_content_addressed
+from core.thumbnails import pregenerate
+from posts.constants import THUMBNAIL_GEOMETRIES
+from posts.images import build_variants, collect, image_storage
+from posts.models import Blob, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки, загруженные до хранилища по содержимому, под '
+        'имена-хэши; одинаковые файлы сливаются в один'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, сколько файлов будет перенесено',
+        )
+
+    def handle(self, *args, **options):
+        storage = image_storage()
+        legacy = [
+            (name, refs) for name, refs in
+            Post.objects.exclude(image='').order_by().values('image')
+            .annotate(refs=Count('id')).values_list('image', 'refs')
+            if not is_content_addressed(name)
+        ]
+        if options['dry_run']:
+            self.stdout.write(f'Будет перенесено файлов: {len(legacy)}')
+            return
+        moved, missing, targets = 0, 0, set()
+        for name, refs in legacy:
+            if not storage.exists(name):
+                self.stderr.write(f'Нет файла: {name}')
+                missing += 1
+                continue
+            with storage.open(name) as file:
+                target = storage.save(name, file)
+            with transaction.atomic():
+                # update() не шлёт сигналов: ссылки переносятся здесь.
+                Post.objects.filter(image=name).update(image=target)
+                Blob.objects.update_or_create(name=name, defaults={'refs': 0})
+                updated = Blob.objects.filter(name=target).update(
+                    refs=F('refs') + refs
+                )
+                if not updated:
+                    Blob.objects.create(name=target, refs=refs)
+            # Старый файл, его миниатюры и варианты больше не нужны.
+            collect(name)
+            targets.add(target)
+            moved += 1
+        for target in targets:
+            try:
+                pregenerate(Post(image=target).image, THUMBNAIL_GEOMETRIES)
+                build_variants(target)
+            except OSError as error:
+                self.stderr.write(f'Не удалось обработать {target}: {error}')
+        if moved:
+            # В кэше страниц остались ссылки на старые имена.
+            cache.clear()
+        self.stdout.write(
+            f'Перенесено файлов: {moved}, уникальных: {len(targets)}, '
+            f'не найдено: {missing}'
+        )
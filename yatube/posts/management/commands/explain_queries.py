@@ -0,0 +1,105 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Post
+from posts.paginator import NEXT, encode_cursor
+
+# Полный проход по таблице без индекса; SCAN ... USING INDEX — это
+# чтение индекса по порядку, оно допустимо для первой страницы.
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\S+( AS \S+)?$')
+# Страница по курсору должна искать позицию в индексе: проход индекса
+# с начала делает дальние страницы всё дороже.
+INDEX_SCAN = re.compile(r'^SCAN (TABLE )?\S+( AS \S+)? USING ')
+KEYSET = re.compile(r'"pub_date" [<>]')
+TEMP_SORT = 'USE TEMP B-TREE'
+DUMMY_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+def problems(plan, sql=''):
+    """Строки плана с полным сканированием или временной сортировкой.
+
+    Для запроса с условием по ключу курсора плох и проход индекса.
+    """
+    keyset = KEYSET.search(sql)
+    return [
+        detail for detail in plan
+        if FULL_SCAN.match(detail) or TEMP_SORT in detail
+        or (keyset and INDEX_SCAN.match(detail))
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает EXPLAIN QUERY PLAN для запросов страниц постов и '
+        'завершается ошибкой при полном сканировании или сортировке'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда работает только с SQLite')
+        post = Post.objects.filter(group__isnull=False).first()
+        follow = Follow.objects.first()
+        if post is None or follow is None:
+            raise CommandError(
+                'Нужны хотя бы один пост с группой и одна подписка'
+            )
+        listings = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[post.group.slug]),
+            reverse('posts:profile', args=[post.author.username]),
+            reverse('posts:post_comments', args=[post.pk]),
+            reverse('posts:follow_index'),
+        )
+        # Курсор с позиции поста: страница после него может быть пустой,
+        # но запрос с условием по ключу выполнится в каждой ленте.
+        cursor = encode_cursor(NEXT, 2, post.pub_date, post.pk)
+        pages = (
+            *listings,
+            reverse('posts:post_detail', args=[post.pk]),
+            *(f'{url}?cursor={cursor}' for url in listings),
+        )
+        self.verbosity = options['verbosity']
+        failures = 0
+        # Кэш отключён, чтобы выполнились все запросы страниц; сессия
+        # входа откатывается вместе с транзакцией.
+        with override_settings(
+            CACHES=DUMMY_CACHE, ALLOWED_HOSTS=['testserver']
+        ), transaction.atomic():
+            client = Client()
+            client.force_login(follow.user)
+            for url in pages:
+                failures += self.check_page(client, url)
+            transaction.set_rollback(True)
+        if failures:
+            raise CommandError(f'Запросов с плохим планом: {failures}')
+        self.stdout.write('Все запросы используют индексы.')
+
+    def check_page(self, client, url):
+        with CaptureQueriesContext(connection) as context:
+            client.get(url)
+        failures = 0
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+            bad = problems(plan, sql)
+            if bad:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'{url}: {sql}'))
+                for detail in bad:
+                    self.stdout.write(f'    {detail}')
+            elif self.verbosity > 1:
+                self.stdout.write(f'{url}: {sql}')
+                for detail in plan:
+                    self.stdout.write(f'    {detail}')
+        return failures
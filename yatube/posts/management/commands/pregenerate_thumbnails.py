@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.thumbnails import pregenerate
+from posts.constants import THUMBNAIL_GEOMETRIES
+from posts.images import build_variants
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт недостающие миниатюры и варианты для srcset картинок уже '
+        'загруженных постов'
+    )
+
+    def handle(self, *args, **options):
+        seen = set()
+        variants = 0
+        for post in Post.objects.exclude(image='').only('image').iterator():
+            if post.image.name in seen:
+                continue
+            seen.add(post.image.name)
+            pregenerate(post.image, THUMBNAIL_GEOMETRIES)
+            variants += build_variants(post.image.name)
+        self.stdout.write(
+            f'Картинок обработано: {len(seen)}, новых вариантов: {variants}'
+        )
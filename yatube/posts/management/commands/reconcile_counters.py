@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import reconcile_blobs, reconcile_posts, reconcile_users
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, подписок, комментариев и ссылок '
+        'на картинки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, сколько счётчиков разошлось',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        with transaction.atomic():
+            users = reconcile_users(dry_run)
+            posts = reconcile_posts(dry_run)
+            blobs = reconcile_blobs(dry_run)
+        verb = 'Разошлось' if dry_run else 'Исправлено'
+        self.stdout.write(
+            f'{verb} счётчиков: пользователей {users}, постов {posts}, '
+            f'картинок {blobs}'
+        )
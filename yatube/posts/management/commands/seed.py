@@ -0,0 +1,318 @@
+import io
+import random
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from posts.constants import FANOUT_LIMIT
+from posts.excerpts import excerpt_html
+from posts.images import image_storage
+from posts.models import (
+    Blob, Comment, Follow, Group, HotAuthor, Post, Timeline, User, UserStats,
+)
+
+TEXT_POOL_SIZE = 500
+NAME_POOL_SIZE = 200
+PLACEHOLDERS = 5
+# Доля постов, опубликованных «всплесками» вокруг случайных моментов.
+BURST_SHARE = 0.7
+BURST_SIZE = 200
+BURST_SECONDS = 3 * 60 * 60
+COMMENT_DELAY = 6 * 60 * 60
+
+
+def with_excerpt(post):
+    # bulk_create не шлёт pre_save, где считается анонс.
+    post.excerpt = excerpt_html(post.text)
+    return post
+
+
+def skewed(rng, count, alpha, k):
+    """k индексов из range(count) со степенным распределением.
+
+    Какие индексы «популярны», решает случайная перестановка, чтобы
+    популярность не совпадала с порядком id.
+    """
+    order = rng.sample(range(count), count)
+    weights = list(accumulate(1 / rank ** alpha for rank in
+                              range(1, count + 1)))
+    return rng.choices(order, cum_weights=weights, k=k)
+
+
+def bursty_times(rng, count, now, days):
+    """Моменты публикаций: фон плюс всплески, по возрастанию."""
+    span = days * 24 * 60 * 60
+    bursts = [rng.uniform(0, span) for _ in range(count // BURST_SIZE + 1)]
+    offsets = []
+    for _ in range(count):
+        if rng.random() < BURST_SHARE:
+            offset = rng.choice(bursts) - rng.expovariate(1 / BURST_SECONDS)
+        else:
+            offset = rng.uniform(0, span)
+        offsets.append(min(max(offset, 0), span))
+    offsets.sort(reverse=True)
+    return [now - timedelta(seconds=offset) for offset in offsets]
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+@contextmanager
+def explicit_dates(*models):
+    """Разрешает задать pub_date вручную, несмотря на auto_now_add."""
+    fields = [model._meta.get_field('pub_date') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими данными в масштабе продакшена'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument(
+            '--images', type=float, default=0,
+            help='Доля постов с картинкой-заглушкой, от 0 до 1',
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя')
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.rows = Counter()
+        started = time.perf_counter()
+        try:
+            with transaction.atomic(), explicit_dates(Post, Comment):
+                self.seed()
+        except IntegrityError:
+            raise CommandError(
+                f'Данные с seed {options["seed"]} уже есть в базе'
+            )
+        # Массовые вставки не вызывают сигналы, поэтому кэш страниц и
+        # поколения сбрасываются целиком.
+        cache.clear()
+        elapsed = time.perf_counter() - started
+        total = sum(self.rows.values())
+        summary = ', '.join(f'{name} {n}' for name, n in self.rows.items())
+        self.stdout.write(
+            f'Создано: {summary}. '
+            f'{total} строк за {elapsed:.1f} с ({total / elapsed:.0f} в с)'
+        )
+
+    def insert(self, model, objects):
+        name = model._meta.model_name
+        for batch in batches(objects, self.batch_size):
+            model.objects.bulk_create(batch)
+            self.rows[name] += len(batch)
+
+    def inserted_ids(self, model, before, count):
+        """id только что вставленных строк в порядке вставки."""
+        found = model.objects.filter(pk__gt=before).aggregate(
+            first=Min('pk'), last=Max('pk'), count=Count('pk')
+        )
+        if found['count'] != count or (
+                found['last'] - found['first'] + 1 != count):
+            raise CommandError(
+                f'{model._meta.model_name}: во время заполнения '
+                'в таблицу писал кто-то ещё'
+            )
+        return range(found['first'], found['last'] + 1)
+
+    def last_id(self, model):
+        return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+    def seed(self):
+        options = self.options
+        rng = self.rng
+        seed = options['seed']
+        now = timezone.now()
+        pool = [self.fake.sentence(nb_words=12) for _ in range(TEXT_POOL_SIZE)]
+        first_names = [self.fake.first_name() for _ in range(NAME_POOL_SIZE)]
+        last_names = [self.fake.last_name() for _ in range(NAME_POOL_SIZE)]
+
+        before = self.last_id(User)
+        password = make_password('yatube')
+        self.insert(User, (
+            User(
+                username=f'seed{seed}_{i}',
+                first_name=rng.choice(first_names),
+                last_name=rng.choice(last_names),
+                password=password,
+                date_joined=now,
+            )
+            for i in range(options['users'])
+        ))
+        users = self.inserted_ids(User, before, options['users'])
+
+        before = self.last_id(Group)
+        self.insert(Group, (
+            Group(
+                title=self.fake.catch_phrase(),
+                slug=f'seed{seed}-{i}',
+                description=self.fake.paragraph(),
+            )
+            for i in range(options['groups'])
+        ))
+        groups = self.inserted_ids(Group, before, options['groups'])
+
+        follows = self.follow_pairs(len(users), options['follows'])
+        followers = defaultdict(list)
+        for user, author in follows:
+            followers[author].append(user)
+        hot = {
+            author for author, users_ in followers.items()
+            if len(users_) > FANOUT_LIMIT
+        }
+
+        post_count = options['posts']
+        authors = skewed(rng, len(users), 1.2, post_count)
+        post_groups = (
+            skewed(rng, len(groups), 1.0, post_count) if groups else []
+        )
+        times = bursty_times(rng, post_count, now, options['days'])
+        commented = skewed(rng, post_count, 1.1, options['comments']) \
+            if post_count else []
+        comments_count = Counter(commented)
+        images = self.placeholders() if options['images'] else []
+
+        before = self.last_id(Post)
+        self.insert(Post, (
+            with_excerpt(Post(
+                author_id=users[authors[i]],
+                group_id=(
+                    groups[post_groups[i]]
+                    if groups and rng.random() < 0.6 else None
+                ),
+                text=' '.join(rng.choices(pool, k=rng.randint(1, 6))),
+                pub_date=times[i],
+                image=(
+                    rng.choice(images)
+                    if images and rng.random() < options['images'] else ''
+                ),
+                comments_count=comments_count[i],
+            ))
+            for i in range(post_count)
+        ))
+        posts = self.inserted_ids(Post, before, post_count)
+
+        self.insert(Comment, (
+            Comment(
+                post_id=posts[i],
+                author_id=users[rng.randrange(len(users))],
+                text=rng.choice(pool),
+                pub_date=min(
+                    times[i] + timedelta(
+                        seconds=rng.expovariate(1 / COMMENT_DELAY)
+                    ),
+                    now,
+                ),
+            )
+            for i in commented
+        ))
+        self.insert(Follow, (
+            Follow(user_id=users[user], author_id=users[author])
+            for user, author in follows
+        ))
+        self.insert(HotAuthor, (
+            HotAuthor(author_id=users[author]) for author in sorted(hot)
+        ))
+        self.insert(Timeline, (
+            Timeline(user_id=users[user], post_id=posts[i], pub_date=times[i])
+            for i in range(post_count)
+            if authors[i] not in hot
+            for user in followers[authors[i]]
+        ))
+        posts_count = Counter(authors)
+        following_count = Counter(user for user, _ in follows)
+        self.insert(UserStats, (
+            UserStats(
+                user_id=users[i],
+                posts_count=posts_count[i],
+                followers_count=len(followers[i]),
+                following_count=following_count[i],
+            )
+            for i in range(len(users))
+        ))
+        self.count_blobs(before)
+
+    def count_blobs(self, before):
+        """Ссылки новых постов на картинки: прибавляются к Blob.
+
+        Заглушки с тем же содержимым могли остаться от прошлого запуска.
+        """
+        refs = dict(
+            Post.objects.filter(pk__gt=before).exclude(image='')
+            .order_by().values('image').annotate(refs=Count('id'))
+            .values_list('image', 'refs')
+        )
+        existing = set(Blob.objects.filter(
+            name__in=refs
+        ).values_list('name', flat=True))
+        for name in existing:
+            Blob.objects.filter(name=name).update(
+                refs=F('refs') + refs[name]
+            )
+        self.insert(Blob, (
+            Blob(name=name, refs=count) for name, count in refs.items()
+            if name not in existing
+        ))
+
+    def follow_pairs(self, user_count, count):
+        """Уникальные подписки; число подписчиков — степенной закон."""
+        rng = self.rng
+        pairs = set()
+        # С запасом на повторы; если пар всё равно не хватило, подписок
+        # будет меньше запрошенного.
+        for author in skewed(rng, user_count, 1.0, count * 3):
+            user = rng.randrange(user_count)
+            if user != author:
+                pairs.add((user, author))
+                if len(pairs) == count:
+                    break
+        return sorted(pairs)
+
+    def placeholders(self):
+        names = []
+        for i in range(PLACEHOLDERS):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            buffer = io.BytesIO()
+            Image.new('RGB', (960, 540), color).save(buffer, 'JPEG')
+            names.append(image_storage().save(
+                f'posts/seed_{self.options["seed"]}_{i}.jpg',
+                ContentFile(buffer.getvalue()),
+            ))
+        return names
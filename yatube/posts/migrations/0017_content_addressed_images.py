@@ -0,0 +1,47 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:06
+
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_blobs(apps, schema_editor):
+    # Уже загруженные файлы остаются под прежними именами; перенести их
+    # в хранилище по содержимому можно командой dedupe_media.
+    Blob = apps.get_model('posts', 'Blob')
+    Post = apps.get_model('posts', 'Post')
+    refs = (
+        Post.objects.exclude(image='').order_by().values('image')
+        .annotate(n=Count('id')).values_list('image', 'n')
+    )
+    Blob.objects.bulk_create(
+        [Blob(name=name, refs=n) for name, n in refs], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('refs', models.IntegerField(default=0, verbose_name='Ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл',
+                'verbose_name_plural': 'Файлы',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Вставьте изображение', storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.RunPython(fill_blobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:17
+
+from django.db import migrations, models
+
+from posts import excerpts
+
+
+def fill_excerpts(apps, schema_editor):
+    excerpts.backfill(apps.get_model('posts', 'Post'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.TextField(blank=True, editable=False, verbose_name='Анонс (HTML)'),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 from core.models import CreatedModel
+from core.storage import ContentAddressedStorage
 
 
 User = get_user_model()
@@ -42,14 +43,37 @@ class Post(CreatedModel):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         help_text='Вставьте изображение',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
+    )
+    excerpt = models.TextField(
+        'Анонс (HTML)',
+        blank=True,
+        editable=False
+    )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
 
     class Meta:
         ordering = ('-pub_date'),
         verbose_name = 'Пост',
         verbose_name_plural = 'Посты',
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='post_page_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'], name='post_group_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_idx'),
+        ]
 
     def __str__(self):
         return self.text
@@ -81,6 +105,8 @@ class Comment(CreatedModel):
         ordering = ('-pub_date'),
         verbose_name = 'Комментарий',
         verbose_name_plural = 'Комментарии',
+        indexes = [models.Index(
+            fields=['post', '-pub_date', '-id'], name='comment_post_idx')]
 
     def __str__(self):
         return self.text
@@ -103,3 +129,95 @@ class Follow(models.Model):
         verbose_name_plural = 'Подписки',
         constraints = [models.UniqueConstraint(
             fields=['user', 'author'], name='unique_members')]
+        indexes = [models.Index(
+            fields=['author', 'user'], name='follow_author_idx')]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class Timeline(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'post'], name='unique_timeline_entry')]
+        indexes = [models.Index(
+            fields=['user', '-pub_date', '-post'], name='timeline_page_idx')]
+
+
+class HotAuthor(models.Model):
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='hot',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        verbose_name = 'Популярный автор'
+        verbose_name_plural = 'Популярные авторы'
+
+
+class ImageVariant(models.Model):
+    """Перекодированная копия картинки поста заданной ширины.
+
+    Привязана к имени исходного файла, а не к посту: одна картинка — один
+    набор вариантов.
+    """
+    source = models.CharField('Исходный файл', max_length=255)
+    format = models.CharField('Формат', max_length=10)
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+    file = models.FileField('Файл', upload_to='variants/', max_length=255)
+
+    class Meta:
+        verbose_name = 'Вариант картинки'
+        verbose_name_plural = 'Варианты картинок'
+        constraints = [models.UniqueConstraint(
+            fields=['source', 'format', 'width'], name='unique_variant')]
+
+
+class Blob(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются.
+
+    Одинаковые загрузки хранятся одним файлом; когда ссылок не остаётся,
+    файл удаляется вместе с миниатюрами и вариантами.
+    """
+    name = models.CharField('Файл', max_length=255, unique=True)
+    refs = models.IntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return self.name
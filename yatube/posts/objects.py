@@ -0,0 +1,73 @@
+"""Кэши строк постов, групп и пользователей для страниц.
+
+Пост хранится без автора и группы: они подставляются из кэшей по id.
+Карточки лент — те же посты, но только со столбцами карточки. Хэш
+пароля в общий кэш не кладётся.
+"""
+from core.objectcache import ObjectCache
+
+from .listing import card_columns
+from .models import Group, Post, User
+from .paginator import KeysetSource
+
+users_by_id = ObjectCache(User.objects.defer('password'))
+users = ObjectCache(User.objects.defer('password'), 'username')
+groups_by_id = ObjectCache(Group)
+groups = ObjectCache(Group, 'slug')
+posts = ObjectCache(
+    Post, related={'author': users_by_id, 'group': groups_by_id}
+)
+cards = ObjectCache(
+    Post.objects.only(*card_columns()),
+    related={'author': users_by_id, 'group': groups_by_id},
+    name='card',
+)
+
+MODEL_CACHES = {
+    Post: (posts, cards),
+    Group: (groups_by_id, groups),
+    User: (users_by_id, users),
+}
+
+
+def previous(instance):
+    """Значения полей кэшей, которые сейчас записаны в базе.
+
+    Вызывается перед сохранением: при смене slug или username нужно
+    сбросить и запись под старым значением.
+    """
+    fields = [
+        objects.field for objects in MODEL_CACHES[type(instance)]
+        if objects.field != 'pk'
+    ]
+    if instance.pk is None or not fields:
+        return {}
+    values = type(instance)._base_manager.filter(
+        pk=instance.pk
+    ).values_list(*fields).first()
+    return dict(zip(fields, values or ()))
+
+
+def forget(instance, old=None):
+    old = old or {}
+    for objects in MODEL_CACHES[type(instance)]:
+        objects.forget(objects.value(instance), old.get(objects.field))
+
+
+def card_source(queryset=None):
+    """Источник ленты из постов со столбцами кэша карточек.
+
+    paginate кладёт прочитанные посты в кэш карточек, а в кэше страницы
+    хранит только их id. queryset строится от Post.objects, а не от
+    related-менеджера: тот присваивает строкам объект связи поверх
+    прочитанного select_related.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    return KeysetSource(cards.shape(queryset))
+
+
+def forget_posts(*pks):
+    """Сбрасывает посты, изменённые в обход сигналов."""
+    for objects in MODEL_CACHES[Post]:
+        objects.forget(*pks)
@@ -0,0 +1,242 @@
+import base64
+import binascii
+import math
+
+from django.core.paginator import Paginator
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+
+from core.stampede import get_or_build
+
+from .constants import (
+    CONST1, ESTIMATE_THRESHOLD, MAX_OFFSET_PAGE, PAGE_CACHE_TIMEOUT,
+)
+
+NEXT = 'n'
+PREVIOUS = 'p'
+# Наибольшее целое SQLite: смещения и id больше него база не примет.
+MAX_INTEGER = 2 ** 63 - 1
+
+
+def encode_cursor(direction, number, pub_date, pk):
+    """pub_date — дата или, для поиска, число с плавающей точкой."""
+    if isinstance(pub_date, float):
+        pub_date = repr(pub_date)
+    else:
+        pub_date = pub_date.isoformat()
+    raw = f'{direction}|{number}|{pub_date}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (direction, number, pub_date, pk) или None."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, number, pub_date, pk = raw.split('|')
+        number, pk = int(number), int(pk)
+        pub_date = parse_datetime(pub_date) or _score(pub_date)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or pub_date is None:
+        return None
+    if not 1 <= number <= MAX_INTEGER or abs(pk) > MAX_INTEGER:
+        return None
+    return direction, number, pub_date, pk
+
+
+def _score(value):
+    score = float(value)
+    return score if math.isfinite(score) else None
+
+
+class KeysetSource:
+    """Queryset, который листается по ключу (date_field, id_field).
+
+    item превращает строку выборки в объект страницы — например,
+    запись ленты подписок в её пост.
+    """
+
+    def __init__(self, queryset, date_field='pub_date', id_field='id',
+                 item=None):
+        self.queryset = queryset
+        self.date_field = date_field
+        self.id_field = id_field
+        self.item = item
+
+    def key(self, row):
+        return getattr(row, self.date_field), getattr(row, self.id_field)
+
+    def fetch(self, limit, descending=True, position=None, offset=0):
+        sign = '-' if descending else ''
+        queryset = self.queryset.order_by(
+            sign + self.date_field, sign + self.id_field
+        )
+        if position is not None:
+            lookup = 'lt' if descending else 'gt'
+            pub_date, pk = position
+            # Диапазон по дате отдельным условием: с ним SQLite ищет по
+            # индексу, а одно OR проверял бы построчно.
+            queryset = queryset.filter(
+                **{f'{self.date_field}__{lookup}e': pub_date}
+            ).filter(
+                Q(**{f'{self.date_field}__{lookup}': pub_date})
+                | Q(**{
+                    self.date_field: pub_date,
+                    f'{self.id_field}__{lookup}': pk,
+                })
+            )
+        return [
+            (self.key(row), self.item(row) if self.item else row)
+            for row in queryset[offset:offset + limit]
+        ]
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (pub_date, id) вместо COUNT(*) и OFFSET.
+
+    object_list — queryset, KeysetSource или их список: источники
+    сливаются в одну ленту. Страница — обычный Page с атрибутами next_cursor и
+    previous_cursor. Общее число страниц неизвестно, поэтому num_pages —
+    нижняя граница: номер текущей страницы плюс один, если за ней есть
+    ещё записи.
+    """
+
+    def __init__(self, object_list, per_page):
+        super().__init__(object_list, per_page)
+        if isinstance(object_list, (list, tuple)):
+            self.sources = list(object_list)
+        elif isinstance(object_list, KeysetSource):
+            self.sources = [object_list]
+        else:
+            self.sources = [KeysetSource(object_list)]
+
+    def get_page(self, number=None, cursor=None):
+        return self.build(*self.window(number, cursor))
+
+    def window(self, number=None, cursor=None):
+        """Строки страницы: (rows, number, has_next) для build."""
+        position = decode_cursor(cursor) if cursor else None
+        if position is not None:
+            direction, number, pub_date, pk = position
+            if direction == NEXT:
+                return self._window_after(number, (pub_date, pk))
+            return self._window_before(number, (pub_date, pk))
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        return self._window_at(max(number, 1))
+
+    def newest(self):
+        """Ключ (pub_date, id) самой новой записи ленты или None."""
+        rows = self._fetch(1)
+        return rows[0][0] if rows else None
+
+    def _fetch(self, limit, descending=True, position=None):
+        merged = {}
+        for source in self.sources:
+            for key, item in source.fetch(limit, descending, position):
+                merged.setdefault(key, item)
+        keys = sorted(merged, reverse=descending)[:limit]
+        return [(key, merged[key]) for key in keys]
+
+    def _window_at(self, number):
+        # Старые ссылки ?page=N: один срез со смещением, дальше — курсоры.
+        # Один источник отдаёт срез через OFFSET в базе. Слиянию нужны все
+        # строки каждого источника до страницы, поэтому номер страницы
+        # ограничен MAX_OFFSET_PAGE.
+        if len(self.sources) == 1:
+            number = min(number, MAX_INTEGER // self.per_page)
+            offset = (number - 1) * self.per_page
+            rows = self.sources[0].fetch(self.per_page + 1, offset=offset)
+        else:
+            number = min(number, MAX_OFFSET_PAGE)
+            offset = (number - 1) * self.per_page
+            rows = self._fetch(offset + self.per_page + 1)[offset:]
+        return rows[:self.per_page], number, len(rows) > self.per_page
+
+    def _window_after(self, number, position):
+        rows = self._fetch(self.per_page + 1, position=position)
+        return rows[:self.per_page], number, len(rows) > self.per_page
+
+    def _window_before(self, number, position):
+        rows = self._fetch(self.per_page + 1, False, position)
+        if len(rows) <= self.per_page:
+            return self._window_at(1)
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return rows, max(number, 2), True
+
+    def build(self, rows, number, has_next):
+        self.num_pages = number + 1 if has_next else number
+        page = self._get_page([item for _, item in rows], number, self)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if rows and has_next:
+            page.next_cursor = encode_cursor(NEXT, number + 1, *rows[-1][0])
+        if rows and number > 1:
+            page.previous_cursor = encode_cursor(
+                PREVIOUS, number - 1, *rows[0][0]
+            )
+        return page
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator без полного COUNT(*) на больших таблицах.
+
+    Строки считаются только до ESTIMATE_THRESHOLD. Если их больше, для
+    таблицы без фильтров число оценивается по наибольшему id, а выборка
+    с фильтрами обрезается до порога: дальше её надо сужать фильтрами.
+    estimated показывает, что count приблизительный.
+    """
+
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        bounded = queryset[:ESTIMATE_THRESHOLD + 1].count()
+        if bounded <= ESTIMATE_THRESHOLD:
+            return bounded
+        self.estimated = True
+        if queryset.query.where:
+            return ESTIMATE_THRESHOLD
+        last = queryset.model._default_manager.aggregate(last=Max('pk'))
+        return max(last['last'] or 0, bounded)
+
+
+def paginate(request, object_list, key=None, version=None,
+             per_page=CONST1, objects=None):
+    """Страница ленты по ?cursor= или ?page=.
+
+    С key в кэше с защитой от одновременной пересборки лежат только id
+    элементов страницы; version — поколения состава ленты. Сами элементы
+    берутся из objects, ObjectCache: правка одного элемента не сбрасывает
+    страницы. Источники отдают объекты или id; прочитанные объекты
+    кладутся в objects, пропавшие из него элементы пропускаются.
+    """
+    paginator = CursorPaginator(object_list, per_page)
+    number, cursor = request.GET.get('page'), request.GET.get('cursor')
+    if key is None:
+        return paginator.get_page(number, cursor)
+    loaded = {}
+
+    def build():
+        rows, page, has_next = paginator.window(number, cursor)
+        items = [item for _, item in rows if hasattr(item, 'pk')]
+        objects.store(items)
+        loaded.update((item.pk, item) for item in items)
+        return [
+            (row, getattr(item, 'pk', item)) for row, item in rows
+        ], page, has_next
+
+    rows, page, has_next = get_or_build(
+        f'ids:{key}', build, PAGE_CACHE_TIMEOUT, version
+    )
+    missing = [pk for _, pk in rows if pk not in loaded]
+    if missing:
+        loaded.update(objects.get_many(missing))
+    rows = [(row, loaded[pk]) for row, pk in rows if pk in loaded]
+    return paginator.build(rows, page, has_next)
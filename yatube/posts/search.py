@@ -0,0 +1,191 @@
+"""Полнотекстовый поиск по постам и комментариям на SQLite FTS5.
+
+Индексы — FTS5-таблицы с внешним содержимым поверх posts_post и
+posts_comment. Их синхронизируют триггеры, поэтому в индекс попадают и
+массовые вставки, и правки в обход моделей.
+"""
+import re
+from collections import namedtuple
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .listing import post_listing
+from .models import Comment
+
+Index = namedtuple('Index', 'table source')
+
+POSTS = Index('posts_post_fts', 'posts_post')
+COMMENTS = Index('posts_comment_fts', 'posts_comment')
+INDEXES = (POSTS, COMMENTS)
+
+TOKEN_RE = re.compile(r'\w+')
+MAX_TERMS = 8
+# Слова от этой длины ищутся по префиксу: «пост» найдёт и «посты».
+PREFIX_MIN = 3
+SNIPPET_TOKENS = 16
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+
+def _triggers(index):
+    table, source = index
+    delete = (
+        f"INSERT INTO {table}({table}, rowid, text) "
+        f"VALUES ('delete', old.id, old.text);"
+    )
+    insert = f'INSERT INTO {table}(rowid, text) VALUES (new.id, new.text);'
+    return {
+        f'{table}_insert': f'AFTER INSERT ON {source} BEGIN {insert} END',
+        f'{table}_delete': f'AFTER DELETE ON {source} BEGIN {delete} END',
+        f'{table}_update': (
+            f'AFTER UPDATE OF text ON {source} BEGIN {delete} {insert} END'
+        ),
+    }
+
+
+def install(connection):
+    """Создаёт индексы и триггеры, которых нет.
+
+    Перестройка таблицы при миграции на SQLite удаляет её триггеры;
+    если их пришлось создать заново, индекс перестраивается целиком.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+        )
+        existing = {name for name, in cursor.fetchall()}
+        for index in INDEXES:
+            table, source = index
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5('
+                f"text, content='{source}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+            missing = {
+                name: sql for name, sql in _triggers(index).items()
+                if name not in existing
+            }
+            for name, sql in missing.items():
+                cursor.execute(f'CREATE TRIGGER {name} {sql}')
+            if missing:
+                cursor.execute(
+                    f"INSERT INTO {table}({table}) VALUES ('rebuild')"
+                )
+
+
+def uninstall(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for index in INDEXES:
+            for name in _triggers(index):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {index.table}')
+
+
+def match_query(text):
+    """Запрос FTS5 из пользовательского ввода или None.
+
+    Слова берутся в кавычки, поэтому синтаксис FTS5 во вводе не работает
+    и не ломает запрос; все слова должны встретиться в тексте.
+    """
+    terms = TOKEN_RE.findall(text.lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    return ' '.join(
+        f'"{term}"*' if len(term) >= PREFIX_MIN else f'"{term}"'
+        for term in terms
+    )
+
+
+class Matching(RawSQL):
+    """Подзапрос для pk__in.
+
+    RawSQL берёт SQL в скобки, и вместе со скобками IN получается
+    скалярный подзапрос ((SELECT ...)), который SQLite сводит к первой
+    строке.
+    """
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def matching(index, match):
+    """Подзапрос id строк, подходящих под match, для pk__in."""
+    return Matching(
+        f'SELECT rowid FROM {index.table} WHERE {index.table} MATCH %s',
+        [match],
+    )
+
+
+def highlight(snippet):
+    """Фрагмент с найденными словами в <mark>; остальное экранировано."""
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+class SearchSource:
+    """Результаты поиска как источник для CursorPaginator.
+
+    Ключ строки — (-rank, id): чем выше релевантность, тем раньше строка.
+    Найденные объекты получают атрибут snippet.
+    """
+
+    def __init__(self, index, match, hydrate):
+        self.index = index
+        self.match = match
+        self.hydrate = hydrate
+
+    def fetch(self, limit, descending=True, position=None, offset=0):
+        table = self.index.table
+        params = [MARK_START, MARK_END, '…', SNIPPET_TOKENS, self.match]
+        where = ''
+        if position is not None:
+            score, pk = position
+            # Страница дальше — хуже ранг (больше rank) или тот же ранг
+            # и меньший id; назад — наоборот.
+            rank_op, id_op = ('>', '<') if descending else ('<', '>')
+            where = (
+                f'AND (rank {rank_op} %s OR (rank = %s AND rowid {id_op} %s))'
+            )
+            params += [-score, -score, pk]
+        order = 'rank, rowid DESC' if descending else 'rank DESC, rowid'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, rank, snippet({table}, 0, %s, %s, %s, %s) '
+                f'FROM {table} WHERE {table} MATCH %s {where} '
+                f'ORDER BY {order} LIMIT %s OFFSET %s',
+                params + [limit, offset],
+            )
+            rows = cursor.fetchall()
+        objects = self.hydrate([pk for pk, _, _ in rows])
+        found = []
+        for pk, rank, snippet in rows:
+            item = objects.get(pk)
+            if item is None:
+                continue
+            item.snippet = highlight(snippet)
+            found.append(((-rank, pk), item))
+        return found
+
+
+def hydrate_posts(ids):
+    return post_listing().in_bulk(ids)
+
+
+def hydrate_comments(ids):
+    return Comment.objects.select_related('author').in_bulk(ids)
+
+
+def search_sources(match, scope):
+    if scope == 'comments':
+        return [SearchSource(COMMENTS, match, hydrate_comments)]
+    return [SearchSource(POSTS, match, hydrate_posts)]
@@ -0,0 +1,180 @@
+from django.db import connections
+from django.db.models.signals import (
+    post_delete, post_migrate, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from core import background
+
+from . import (
+    caching, counters, excerpts, images, objects, search, timeline,
+)
+from .models import Comment, Follow, Group, Post, User
+
+
+def bump_post(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        caching.bump(*caching.post_scopes(post), lists=False)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    if 'text' not in instance.get_deferred_fields():
+        instance.excerpt = excerpts.excerpt_html(instance.text)
+    instance._old_group_id = None
+    instance._old_image = None
+    if instance.pk is not None:
+        instance._old_group_id, instance._old_image = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', 'image').first() or (None, None)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    user_ids = timeline.readers(instance.author_id)
+    if created:
+        counters.change_user(instance.author_id, posts_count=1)
+        timeline.fan_out(instance, user_ids)
+    old_group_id = getattr(instance, '_old_group_id', None)
+    # Пост остался в тех же лентах на том же месте: списки id не
+    # меняются.
+    moved = created or old_group_id != instance.group_id
+    caching.bump(
+        *caching.post_scopes(instance, [old_group_id], user_ids),
+        lists=moved,
+    )
+    objects.forget(instance)
+    image = instance.image.name or None
+    old_image = getattr(instance, '_old_image', None) or None
+    if image != old_image:
+        if image:
+            images.retain(image)
+            background.defer(images.prepare_image, instance.pk)
+        if old_image:
+            images.release(old_image)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, posts_count=-1)
+    caching.bump(*caching.post_scopes(instance))
+    objects.forget(instance)
+    if instance.image:
+        images.release(instance.image.name)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments(instance.post_id, 1)
+        objects.forget_posts(instance.post_id)
+    bump_post(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+    objects.forget_posts(instance.post_id)
+    bump_post(instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.author_id, followers_count=1)
+        counters.change_user(instance.user_id, following_count=1)
+        timeline.follow_added(instance)
+        caching.bump(*caching.follow_write_scopes(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, followers_count=-1)
+    counters.change_user(instance.user_id, following_count=-1)
+    timeline.follow_removed(instance)
+    caching.bump(*caching.follow_write_scopes(instance))
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, **kwargs):
+    instance._old_lookups = objects.previous(instance)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    objects.forget(instance, getattr(instance, '_old_lookups', None))
+    # Новая группа тоже сбрасывает поколение: её id мог принадлежать
+    # удалённой группе, чьи страницы ещё лежат в кэше.
+    caching.bump((caching.GROUP, instance.pk), lists=created)
+    if not created:
+        # slug группы есть в карточках всех лент с её постами.
+        caching.bump(
+            *caching.shown_in(Post.objects.filter(group_id=instance.pk)),
+            lists=False,
+        )
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # Посты группы отвязываются UPDATE без сигналов: их записи в кэше
+    # ссылались бы на удалённую группу.
+    objects.forget_posts(*instance.posts.values_list('pk', flat=True))
+    caching.bump(
+        *caching.shown_in(Post.objects.filter(group_id=instance.pk)),
+        lists=False,
+    )
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    objects.forget(instance)
+
+
+# Поля пользователя, которые выводят карточки его постов.
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def only_last_login(update_fields):
+    return update_fields is not None and set(update_fields) == {'last_login'}
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    if only_last_login(update_fields):
+        return
+    instance._old_lookups = objects.previous(instance)
+    instance._old_name = None
+    if instance.pk is not None:
+        instance._old_name = User.objects.filter(
+            pk=instance.pk
+        ).values_list(*NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    if only_last_login(update_fields):
+        return
+    objects.forget(instance, getattr(instance, '_old_lookups', None))
+    scopes = [(caching.AUTHOR, instance.pk), (caching.PROFILE, instance.pk)]
+    name = tuple(getattr(instance, field) for field in NAME_FIELDS)
+    old_name = getattr(instance, '_old_name', None)
+    if old_name is not None and old_name != name:
+        # Имя автора есть в карточках его постов во всех лентах.
+        scopes += caching.shown_in(Post.objects.filter(author_id=instance.pk))
+    caching.bump(*dict.fromkeys(scopes), lists=False)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    objects.forget(instance)
+
+
+@receiver(post_migrate)
+def search_repaired(sender, using, **kwargs):
+    # Миграции, перестраивающие таблицы постов, удаляют их триггеры;
+    # индекс создаёт миграция 0015, здесь триггеры только возвращаются.
+    connection = connections[using]
+    if sender.name == 'posts' and (
+            search.POSTS.table in connection.introspection.table_names()):
+        search.install(connection)
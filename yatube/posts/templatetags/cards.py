@@ -0,0 +1,61 @@
+import hashlib
+
+from django import template
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from posts.constants import CARD_CACHE_TIMEOUT
+
+from .pictures import prefetch_pictures
+
+register = template.Library()
+
+
+def card_key(name, post, eager=False):
+    """Ключ карточки: шаблон, пост и всё, от чего зависит разметка.
+
+    Правка поста меняет updated, новый комментарий — счётчик, поэтому
+    старая карточка просто перестаёт запрашиваться во всех лентах. Имя
+    автора и slug группы карточка берёт не из поста: их отпечаток тоже
+    входит в ключ, и переименование не оставляет старых карточек.
+    """
+    stamp = post.updated.timestamp()
+    author, group = post.author, post.group
+    related = hashlib.md5(repr((
+        author.username, author.first_name, author.last_name,
+        group.slug if group else None,
+    )).encode()).hexdigest()[:12]
+    return (
+        f'card:{name}:{post.pk}:{stamp}:{post.comments_count}:{int(eager)}:'
+        f'{related}'
+    )
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts, name):
+    """{% post_cards page_obj 'posts/includes/cards/feed.html' as cards %}
+
+    Разметка карточек страницы: готовые берутся из кэша одним get_many,
+    отрисовываются только недостающие. Первая карточка грузит картинку
+    сразу, остальные — лениво.
+    """
+    posts = list(posts)
+    keys = [card_key(name, post, eager=not index)
+            for index, post in enumerate(posts)]
+    found = cache.get_many(keys)
+    missing = [post for post, key in zip(posts, keys) if key not in found]
+    if missing:
+        prefetch_pictures(missing)
+        card = context.template.engine.get_template(name)
+        rendered = {}
+        for post, key in zip(posts, keys):
+            if key in found:
+                continue
+            with context.push(post=post, eager=post is posts[0]):
+                found[key] = card.render(context)
+            # Пока варианты картинки не готовы, карточка показывает
+            # миниатюру; такую не кэшируем, чтобы не закрепить её.
+            if not post.image or post.picture is not None:
+                rendered[key] = found[key]
+        cache.set_many(rendered, CARD_CACHE_TIMEOUT)
+    return [mark_safe(found[key]) for key in keys]
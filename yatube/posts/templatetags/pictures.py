@@ -0,0 +1,33 @@
+from django import template
+
+from core.thumbnails import prefetch, ready
+
+from posts.constants import THUMBNAIL_GEOMETRIES
+from posts.images import pictures
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_pictures(posts):
+    """{% prefetch_pictures page_obj %} или {% prefetch_pictures post %}
+
+    Ставит постам атрибут picture с вариантами картинки для srcset.
+    Постам без вариантов — fallback: готовую миниатюру или, если её ещё
+    нет, исходный файл. Метаданные миниатюр загружаются разом для всей
+    страницы, а сами миниатюры при отрисовке не создаются.
+    """
+    if hasattr(posts, 'image'):
+        posts = [posts]
+    posts = [post for post in posts if post.image]
+    if not posts:
+        return ''
+    found = pictures([post.image.name for post in posts])
+    for post in posts:
+        post.picture = found.get(post.image.name)
+    pending = [post for post in posts if post.picture is None]
+    geometry, options = THUMBNAIL_GEOMETRIES[0]
+    prefetch([post.image for post in pending], geometry, **options)
+    for post in pending:
+        post.fallback = ready(post.image, geometry, **options) or post.image
+    return ''
@@ -1,16 +1,28 @@
+import hashlib
+import io
+import os
 import tempfile
 import shutil
 
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django import forms
 from http import HTTPStatus
+from PIL import Image
+from sorl.thumbnail.models import KVStore
 
+from core.storage import content_name
+from core.thumbnails import thumbnail_key
+
+from posts.constants import THUMBNAIL_GEOMETRIES
 from posts.forms import PostForm
-from posts.models import Post, Group, Comment
+from posts.images import build_variants
+from posts.models import Blob, Post, Group, Comment, ImageVariant
 from posts.models import User
 
 
@@ -95,7 +107,9 @@ class PostFormCreateTests(TestCase):
             Post.objects.filter(
                 text=form_data['text'],
                 group=form_data['group'],
-                image='posts/big.gif'
+                image=content_name(
+                    'posts/big.gif', hashlib.sha256(IMAGE).hexdigest()
+                )
             ).exists()
         )
 
@@ -134,6 +148,123 @@ class PostFormCreateTests(TestCase):
         self.assertEqual(Post.objects.first().id, self.post.id)
         self.assertTrue(Post.objects.first().image, 'posts/small.gif')
 
+    def test_thumbnails_pregenerated(self):
+        cache.clear()
+        upload = SimpleUploadedFile(
+            name='thumb.gif',
+            content=(
+                b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                b'\x0A\x00\x3B'
+            ),
+            content_type='image/gif'
+        )
+        form_data = {'text': 'С картинкой', 'image': upload}
+        with override_settings(BACKGROUND_EAGER=True):
+            self.authorized_client.post(
+                reverse('posts:post_create'), data=form_data
+            )
+        image = Post.objects.get(text='С картинкой').image
+        for geometry, options in THUMBNAIL_GEOMETRIES:
+            with self.subTest(geometry=geometry):
+                self.assertTrue(KVStore.objects.filter(
+                    key=thumbnail_key(image, geometry, **options)
+                ).exists())
+
+    def test_image_variants(self):
+        cache.clear()
+        # Снимок «с телефона»: пиксели лежат боком, поворот — в EXIF.
+        photo = Image.new('RGB', (400, 1000), 'red')
+        exif = photo.getexif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Камера'
+        buffer = io.BytesIO()
+        photo.save(buffer, 'JPEG', exif=exif)
+        upload = SimpleUploadedFile(
+            name='photo.jpg', content=buffer.getvalue(),
+            content_type='image/jpeg'
+        )
+        form_data = {'text': 'С фото', 'image': upload}
+        with override_settings(BACKGROUND_EAGER=True):
+            self.authorized_client.post(
+                reverse('posts:post_create'), data=form_data
+            )
+        post = Post.objects.get(text='С фото')
+        variants = ImageVariant.objects.filter(
+            source=post.image.name, format='jpeg'
+        ).order_by('width')
+        self.assertEqual(
+            [(item.width, item.height) for item in variants],
+            [(480, 170), (960, 339)],
+        )
+        for variant in variants:
+            with self.subTest(width=variant.width):
+                with Image.open(variant.file.path) as image:
+                    self.assertEqual(
+                        image.size, (variant.width, variant.height)
+                    )
+                    self.assertEqual(dict(image.getexif()), {})
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, f'{variants[1].file.url} 960w')
+        self.assertContains(response, 'width="960" height="339"')
+
+    def test_variant_files_reused(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (600, 300), 'blue').save(buffer, 'JPEG')
+        post = Post.objects.create(
+            author=self.user, text='Синий', image=SimpleUploadedFile(
+                'blue.jpg', buffer.getvalue(), 'image/jpeg'
+            ),
+        )
+        variants = ImageVariant.objects.filter(source=post.image.name)
+        files = sorted(variants.values_list('file', flat=True))
+        self.assertTrue(files)
+        # Строки пропали, файлы остались: новый запуск берёт те же файлы.
+        variants.delete()
+        build_variants(post.image.name)
+        self.assertEqual(
+            sorted(variants.values_list('file', flat=True)), files
+        )
+        directory = os.path.dirname(default_storage.path(files[0]))
+        self.assertEqual(len(os.listdir(directory)), len(files))
+
+    def test_same_image_stored_once(self):
+        content = (
+            b'\x47\x49\x46\x38\x39\x61\x01\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x01\x00\x01\x00\x00\x02\x02\x44'
+            b'\x01\x00\x3B'
+        )
+        with override_settings(BACKGROUND_EAGER=True):
+            for name in ('meme.gif', 'meme_copy.gif'):
+                self.authorized_client.post(reverse('posts:post_create'), {
+                    'text': 'Мем',
+                    'image': SimpleUploadedFile(name, content, 'image/gif'),
+                })
+            first, second = Post.objects.filter(text='Мем')
+            name = first.image.name
+            self.assertEqual(second.image.name, name)
+            self.assertEqual(Blob.objects.get(name=name).refs, 2)
+            self.assertTrue(ImageVariant.objects.filter(source=name).exists())
+
+            first.delete()
+            self.assertTrue(first.image.storage.exists(name))
+            self.assertEqual(Blob.objects.get(name=name).refs, 1)
+
+            second.delete()
+            self.assertFalse(first.image.storage.exists(name))
+            self.assertFalse(Blob.objects.filter(name=name).exists())
+            self.assertFalse(
+                ImageVariant.objects.filter(source=name).exists()
+            )
+
     def test_new_post_correct_forms_fields(self):
         response = self.post_author.get(
             reverse('posts:post_create')
@@ -1,10 +1,30 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import CommandError, call_command
+from django.db.models import Count
+from django.test import TestCase, override_settings
 
-from posts.models import Post, Group, Comment
+from core.storage import is_content_addressed
+from posts.images import image_storage
+from posts.management.commands import benchmark, explain_queries
+from posts.models import (
+    Blob, Post, Group, Comment, Follow, Timeline, UserStats,
+)
 
 
 User = get_user_model()
+GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x80\x00\x00\x00'
+    b'\x00\x00\xFF\xFF\xFF\x21\xF9\x04\x00\x00\x00\x00\x00\x2C'
+    b'\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02\x44\x01\x00\x3B'
+)
 
 
 class PostModelTest(TestCase):
@@ -65,3 +85,288 @@ class PostModelTest(TestCase):
         self.assertEqual(
             comment_help_text, 'Введите текст комментария'
         )
+
+
+class ExcerptTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+
+    def test_excerpt_follows_text(self):
+        post = Post.objects.create(author=self.author, text='раз два')
+        self.assertEqual(post.excerpt, '<p>раз два</p>')
+        post.text = 'слово ' * 31
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.excerpt, '<p>' + 'слово ' * 29 + 'слово …</p>')
+
+    def test_backfill_command(self):
+        for i in range(5):
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+        Post.objects.update(excerpt='')
+        out = StringIO()
+        call_command('backfill_excerpts', batch_size=2, stdout=out)
+        self.assertIn('Анонсов заполнено: 5', out.getvalue())
+        self.assertFalse(Post.objects.filter(excerpt='').exists())
+        self.assertEqual(
+            Post.objects.get(text='Пост 3').excerpt, '<p>Пост 3</p>'
+        )
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+        )
+
+    def test_counters_follow_writes(self):
+        Comment.objects.create(
+            author=self.reader,
+            text='Комментарий',
+            post=self.post
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1
+        )
+        follow.delete()
+        Post.objects.create(author=self.author, text='Второй пост')
+        stats.refresh_from_db()
+        self.assertEqual(stats.followers_count, 0)
+        self.assertEqual(stats.posts_count, 2)
+
+    def test_reconcile_counters_fixes_drift(self):
+        UserStats.objects.filter(user=self.author).update(posts_count=42)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=7)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('пользователей 1, постов 1', out.getvalue())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+        Comment.objects.create(
+            author=cls.reader, text='Комментарий', post=cls.post
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def test_views_use_indexes(self):
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        self.assertIn('Все запросы используют индексы.', out.getvalue())
+
+    def test_index_scan_reported_for_keyset_query(self):
+        plan = ['SCAN posts_post USING INDEX post_page_idx']
+        keyset = 'SELECT ... WHERE "posts_post"."pub_date" < %s'
+        self.assertEqual(explain_queries.problems(plan, keyset), plan)
+        self.assertEqual(explain_queries.problems(plan, 'SELECT ...'), [])
+
+    def test_full_scan_reported(self):
+        with self.assertRaises(CommandError):
+            with mock.patch(
+                'posts.management.commands.explain_queries.FULL_SCAN'
+            ) as full_scan:
+                full_scan.match.return_value = True
+                call_command('explain_queries', stdout=StringIO())
+
+
+class SeedCommandTest(TestCase):
+    options = {
+        'users': 30, 'groups': 3, 'posts': 60, 'comments': 90,
+        'follows': 80, 'stdout': StringIO(),
+    }
+
+    def snapshot(self):
+        return (
+            list(Post.objects.values_list(
+                'author__username', 'group__slug', 'text', 'comments_count'
+            )),
+            list(Follow.objects.values_list(
+                'user__username', 'author__username'
+            )),
+            Comment.objects.count(),
+        )
+
+    def test_same_seed_same_data(self):
+        call_command('seed', seed=7, **self.options)
+        first = self.snapshot()
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        call_command('seed', seed=7, **self.options)
+        self.assertEqual(self.snapshot(), first)
+        self.assertEqual(len(first[0]), 60)
+        self.assertEqual(first[2], 90)
+
+    def test_counters_and_timeline_consistent(self):
+        call_command('seed', seed=1, **self.options)
+        out = StringIO()
+        call_command('reconcile_counters', dry_run=True, stdout=out)
+        self.assertIn(
+            'Разошлось счётчиков: пользователей 0, постов 0', out.getvalue()
+        )
+        follow = Follow.objects.filter(
+            author__posts__isnull=False
+        ).first()
+        self.assertTrue(
+            Timeline.objects.filter(
+                user=follow.user, post__author=follow.author
+            ).exists()
+        )
+
+    def test_reseed_with_images_adds_blob_refs(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media):
+            call_command('seed', seed=3, images=0.3, **self.options)
+            call_command('seed', seed=4, images=0.3, **self.options)
+        refs = dict(
+            Post.objects.exclude(image='').order_by().values('image')
+            .annotate(refs=Count('id')).values_list('image', 'refs')
+        )
+        self.assertTrue(refs)
+        self.assertEqual(dict(Blob.objects.values_list('name', 'refs')), refs)
+
+    def test_reseed_rejected(self):
+        call_command('seed', seed=2, **self.options)
+        with self.assertRaises(CommandError):
+            call_command('seed', seed=2, **self.options)
+
+
+class DedupeMediaCommandTest(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        author = User.objects.create_user(username='author')
+        # Файлы, загруженные до хранилища по содержимому: имена свои,
+        # содержимое одно.
+        storage = image_storage()
+        self.legacy = []
+        for name in ('posts/a.gif', 'posts/b.gif'):
+            path = storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(GIF)
+            self.legacy.append(name)
+            Post.objects.create(author=author, text=name, image=name)
+        Post.objects.create(author=author, text='Копия', image='posts/a.gif')
+
+    def test_legacy_files_merged(self):
+        out = StringIO()
+        call_command('dedupe_media', stdout=out)
+        self.assertIn('Перенесено файлов: 2, уникальных: 1', out.getvalue())
+        names = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(is_content_addressed(name))
+        self.assertEqual(Blob.objects.get(name=name).refs, 3)
+        storage = image_storage()
+        for legacy in self.legacy:
+            with self.subTest(legacy=legacy):
+                self.assertFalse(storage.exists(legacy))
+                self.assertFalse(Blob.objects.filter(name=legacy).exists())
+        out = StringIO()
+        call_command('reconcile_counters', dry_run=True, stdout=out)
+        self.assertIn('картинок 0', out.getvalue())
+
+    def test_dry_run_changes_nothing(self):
+        out = StringIO()
+        call_command('dedupe_media', dry_run=True, stdout=out)
+        self.assertIn('Будет перенесено файлов: 2', out.getvalue())
+        self.assertTrue(image_storage().exists('posts/a.gif'))
+
+
+class BenchmarkCommandTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.create(author=author, text='Тестовый пост', group=group)
+        Follow.objects.create(user=reader, author=author)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.directory.name, 'bench.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def bench(self, **options):
+        call_command(
+            'benchmark', iterations=3, warmup=1, alloc_samples=1,
+            stdout=StringIO(), **options
+        )
+
+    def test_results_saved_and_writes_rolled_back(self):
+        self.bench(output=self.output)
+        with open(self.output, encoding='utf-8') as file:
+            results = json.load(file)['results']
+        self.assertEqual(set(results), {
+            'index', 'group_posts', 'profile', 'post_detail',
+            'follow_index', 'post_create', 'add_comment',
+        })
+        self.assertGreater(results['add_comment']['queries'], 0)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 0)
+
+    def test_cache_keeps_production_options(self):
+        command = benchmark.Command()
+        command.options = {'no_cache': False}
+        default = command.caches(self.directory.name)['default']
+        self.assertEqual(
+            default['OPTIONS'], settings.CACHES['default']['OPTIONS']
+        )
+        self.assertTrue(default['LOCATION'].startswith(self.directory.name))
+
+    def test_regression_against_baseline(self):
+        self.bench(output=self.output, only=['add_comment'])
+        with open(self.output, encoding='utf-8') as file:
+            saved = json.load(file)
+        saved['results']['add_comment']['queries'] /= 2
+        with open(self.output, 'w', encoding='utf-8') as file:
+            json.dump(saved, file)
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command(
+                'benchmark', iterations=3, warmup=1, alloc_samples=1,
+                baseline=self.output, only=['add_comment'], stdout=out,
+            )
+        self.assertIn('add_comment: queries', out.getvalue())
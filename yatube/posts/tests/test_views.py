@@ -1,5 +1,6 @@
 import tempfile
 import shutil
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.conf import settings
@@ -7,15 +8,26 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from http import HTTPStatus
 
+from core.testing import assert_query_budget
+from posts import caching, views
+from posts.constants import COMMENTS_PER_PAGE, MAX_OFFSET_PAGE
 from posts.forms import PostForm, CommentForm
-from posts.models import Post, Group, Comment, Follow
+from posts.images import build_variants
+from posts.models import Post, Group, Comment, Follow, Timeline, HotAuthor
+from posts.paginator import (
+    NEXT, CursorPaginator, KeysetSource, encode_cursor,
+)
+from posts.templatetags.cards import card_key
 
 
 User = get_user_model()
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+LISTING_QUERY_LIMIT = 10
 IMAGE = (
     b'\x47\x49\x46\x38\x39\x61\x02\x00'
     b'\x01\x00\x80\x00\x00\x00\x00\x00'
@@ -256,6 +268,98 @@ class PagintaorViewsTest(TestCase):
             + '?page=2')
         self.assertEqual(len(response.context.get('page_obj')), 4)
 
+    def test_cursor_pages_walk_forward_and_back(self):
+        first_page = self.authorized_client.get(
+            reverse('posts:index')
+        ).context.get('page_obj')
+        self.assertIsNone(first_page.previous_cursor)
+        second_page = self.authorized_client.get(
+            reverse('posts:index') + f'?cursor={first_page.next_cursor}'
+        ).context.get('page_obj')
+        self.assertEqual(len(second_page), 4)
+        self.assertEqual(second_page.number, 2)
+        self.assertIsNone(second_page.next_cursor)
+        back_page = self.authorized_client.get(
+            reverse('posts:index') + f'?cursor={second_page.previous_cursor}'
+        ).context.get('page_obj')
+        self.assertEqual(list(back_page), list(first_page))
+        self.assertEqual(back_page.number, 1)
+
+    def test_cursor_pages_do_not_overlap(self):
+        page = self.authorized_client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        ).context.get('page_obj')
+        seen = list(page)
+        while page.next_cursor:
+            page = self.authorized_client.get(
+                reverse('posts:group_list', kwargs={'slug': self.group.slug})
+                + f'?cursor={page.next_cursor}'
+            ).context.get('page_obj')
+            seen.extend(page)
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), Post.objects.count())
+
+    def test_broken_cursor_shows_first_page(self):
+        response = self.authorized_client.get(
+            reverse('posts:index') + '?cursor=broken'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.context.get('page_obj').number, 1)
+        self.assertEqual(len(response.context.get('page_obj')), 10)
+
+    def test_page_number_read_with_offset(self):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        with CaptureQueriesContext(connection) as queries:
+            page = paginator.get_page(2)
+        self.assertEqual(len(page), 4)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('LIMIT 11 OFFSET 10', queries[0]['sql'])
+
+    def test_huge_page_numbers_do_not_fail(self):
+        huge = 10 ** 20
+        urls = (
+            reverse('posts:index') + '?',
+            reverse('posts:group_list', kwargs={'slug': self.group.slug})
+            + '?',
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+            + '?',
+            reverse('posts:search') + '?q=Тестовый&',
+        )
+        queries = (
+            f'page={huge}',
+            f'cursor={encode_cursor(NEXT, huge, self.post.pub_date, 1)}',
+            f'cursor={encode_cursor(NEXT, 2, self.post.pub_date, huge)}',
+        )
+        for url in urls:
+            for query in queries:
+                with self.subTest(url=url + query):
+                    response = self.authorized_client.get(url + query)
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_cursor_page_bounded_by_date(self):
+        # Старые SQLite не выводят диапазон из OR и сканируют индекс
+        # целиком: граница по дате должна стоять отдельным условием.
+        first = CursorPaginator(Post.objects.all(), 10).get_page(1)
+        with CaptureQueriesContext(connection) as queries:
+            CursorPaginator(Post.objects.all(), 10).get_page(
+                cursor=first.next_cursor
+            )
+        sql = queries[0]['sql']
+        self.assertIn('"posts_post"."pub_date" <= ', sql)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = [row[-1] for row in cursor.fetchall()]
+        self.assertIn('(pub_date<?)', plan[0])
+
+    def test_merged_page_number_capped(self):
+        paginator = CursorPaginator([
+            KeysetSource(Post.objects.filter(group=self.group)),
+            KeysetSource(Post.objects.filter(group=None)),
+        ], 10)
+        page = paginator.get_page(MAX_OFFSET_PAGE * 100)
+        self.assertEqual(page.number, MAX_OFFSET_PAGE)
+        self.assertEqual(len(page), 0)
+
 
 class CommentViewsTest(TestCase):
     @classmethod
@@ -294,6 +398,43 @@ class CommentViewsTest(TestCase):
         first_object = response.context.get('comments')[0]
         self.assertEqual(first_object, self.comment)
 
+    def test_comments_paginated_with_flat_query_count(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        cache.clear()
+        with CaptureQueriesContext(connection) as few:
+            self.guest_client.get(url)
+        Comment.objects.bulk_create(
+            Comment(author=self.user, text=f'Комментарий {i}', post=self.post)
+            for i in range(COMMENTS_PER_PAGE + 5)
+        )
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            response = self.guest_client.get(url)
+        self.assertEqual(len(few), len(many))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertIsNotNone(comments.next_cursor)
+
+    def test_load_more_returns_next_slice(self):
+        Comment.objects.bulk_create(
+            Comment(author=self.user, text=f'Комментарий {i}', post=self.post)
+            for i in range(COMMENTS_PER_PAGE)
+        )
+        cache.clear()
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        cursor = response.context['comments'].next_cursor
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'cursor': cursor},
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(len(response.context['comments']), 1)
+        self.assertContains(response, 'Тестовый комментарий')
+        self.assertNotContains(response, 'data-load-more')
+
 
 class FollowViewsTest(TestCase):
     @classmethod
@@ -379,3 +520,887 @@ class FollowViewsTest(TestCase):
         )
         new_post = response.context.get('page_obj')
         self.assertNotIn(new_post_for_follower, new_post)
+
+    def test_new_post_fans_out_to_followers(self):
+        Follow.objects.create(user=self.follower, author=self.following)
+        new_post = Post.objects.create(
+            author=self.following,
+            text='Новый пост',
+        )
+        self.assertTrue(
+            Timeline.objects.filter(
+                user=self.follower, post=new_post
+            ).exists()
+        )
+
+    def test_unfollow_prunes_timeline(self):
+        Follow.objects.create(user=self.follower, author=self.following)
+        self.authorized_client.get(
+            reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': self.following}
+            )
+        )
+        self.assertFalse(
+            Timeline.objects.filter(user=self.follower).exists()
+        )
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context.get('page_obj')), 0)
+
+    @mock.patch('posts.timeline.FANOUT_LIMIT', 0)
+    def test_hot_author_posts_merged_on_read(self):
+        Follow.objects.create(user=self.follower, author=self.following)
+        self.assertTrue(
+            HotAuthor.objects.filter(author=self.following).exists()
+        )
+        new_post = Post.objects.create(
+            author=self.following,
+            text='Пост популярного автора',
+        )
+        self.assertFalse(Timeline.objects.filter(post=new_post).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        page_obj = response.context.get('page_obj')
+        self.assertEqual(list(page_obj), [new_post, self.post])
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_listing_fragment_cached_until_post_saved(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Тестовый пост')
+        post = Post.objects.get(pk=self.post.pk)
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Новый текст')
+
+    def test_author_rename_bumps_every_feed(self):
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        scopes = [
+            (caching.GLOBAL, None),
+            (caching.GROUP, self.group.pk),
+            (caching.AUTHOR, self.user.pk),
+            (caching.FOLLOWER, reader.pk),
+        ]
+        before = caching.generations(*scopes)
+        author = User.objects.get(pk=self.user.pk)
+        author.set_password('new-password')
+        author.save()
+        self.assertEqual(caching.generations(*scopes)[:2], before[:2])
+        author.last_name = 'Новая фамилия'
+        author.save()
+        after = caching.generations(*scopes)
+        for scope, old, new in zip(scopes, before, after):
+            with self.subTest(scope=scope):
+                self.assertNotEqual(old, new)
+
+    def test_group_rename_bumps_author_feeds(self):
+        before = caching.generations((caching.AUTHOR, self.user.pk))
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'new-slug'
+        group.save()
+        self.assertNotEqual(
+            caching.generations((caching.AUTHOR, self.user.pk)), before
+        )
+
+    def test_pages_cached_separately(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}') for i in range(10)
+        )
+        caching.bump((caching.GLOBAL, None))
+        first = self.guest_client.get(reverse('posts:index'))
+        second = self.guest_client.get(reverse('posts:index') + '?page=2')
+        self.assertNotEqual(first.content, second.content)
+        self.assertContains(second, 'Тестовый пост')
+
+    def test_post_bumps_only_its_scopes(self):
+        scopes = (
+            (caching.GLOBAL, None),
+            (caching.GROUP, self.group.pk),
+            (caching.GROUP, self.other_group.pk),
+        )
+        before = caching.generations(*scopes)
+        Post.objects.create(author=self.user, text='Ещё', group=self.group)
+        after = caching.generations(*scopes)
+        self.assertNotEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+        self.assertEqual(before[2], after[2])
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+
+    def revalidate(self, client, url):
+        response = client.get(url)
+        return client.get(
+            url,
+            HTTP_IF_NONE_MATCH=response['ETag'],
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+
+    def test_unchanged_page_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.revalidate(self.guest_client, url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+                self.assertEqual(response.content, b'')
+        url = reverse('posts:follow_index')
+        response = self.revalidate(self.authorized_client, url)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_not_modified_skips_rendering(self):
+        response = self.guest_client.get(self.urls[0])
+        with self.assertTemplateNotUsed('posts/index.html'):
+            self.guest_client.get(
+                self.urls[0], HTTP_IF_NONE_MATCH=response['ETag']
+            )
+
+    def test_writes_change_validators(self):
+        etags = {url: self.guest_client.get(url)['ETag'] for url in self.urls}
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_follow_changes_profile_and_feed(self):
+        urls = (
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:follow_index'),
+        )
+        etags = {
+            url: self.authorized_client.get(url)['ETag'] for url in urls
+        }
+        Follow.objects.create(user=self.reader, author=self.user)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_validators_depend_on_user(self):
+        reader = self.authorized_client.get(self.urls[0])
+        guest = self.guest_client.get(self.urls[0])
+        self.assertNotEqual(guest['ETag'], reader['ETag'])
+
+    def test_missing_page_still_404(self):
+        response = self.guest_client.get(
+            reverse('posts:group_list', kwargs={'slug': 'missing'})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class FullPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.post_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}
+        )
+        self.profile_url = reverse(
+            'posts:profile', kwargs={'username': self.user}
+        )
+
+    def test_anonymous_page_served_from_cache(self):
+        first = self.guest_client.get(self.post_url)
+        second = self.guest_client.get(self.post_url)
+        self.assertFalse(first.has_header('X-Page-Cache'))
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        self.assertIsNone(second.context)
+        self.assertEqual(first.content, second.content)
+
+    def test_comment_invalidates_page(self):
+        self.guest_client.get(self.post_url)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Новый комментарий'
+        )
+        response = self.guest_client.get(self.post_url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_holes_filled_for_logged_in_user(self):
+        self.guest_client.get(self.post_url)
+        author_client = Client()
+        author_client.force_login(self.user)
+        response = author_client.get(self.post_url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Пользователь: auth')
+        self.assertContains(response, 'Добавить комментарий')
+        self.assertContains(
+            response,
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+        )
+        self.assertNotContains(response, 'Войти')
+
+    def test_follow_button_filled_for_follower(self):
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.guest_client.get(self.profile_url)
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        response = reader_client.get(self.profile_url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Отписаться')
+        self.assertContains(response, 'Пользователь: reader')
+
+    def test_feed_switcher_filled_for_logged_in_user(self):
+        self.guest_client.get(reverse('posts:index'))
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        response = reader_client.get(reverse('posts:index'))
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Избранные авторы')
+        self.assertNotContains(
+            self.guest_client.get(reverse('posts:index')), 'Избранные авторы'
+        )
+
+    def test_logged_in_responses_not_stored(self):
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        reader_client.get(self.post_url)
+        response = self.guest_client.get(self.post_url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertNotContains(response, 'Пользователь: reader')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ListingQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:follow_index'),
+        )
+
+    def add_posts(self, count):
+        for i in range(count):
+            Post.objects.create(
+                author=self.author,
+                group=self.group,
+                text=f'Пост {i}',
+                image=SimpleUploadedFile(
+                    name=f'small{i}.gif',
+                    content=IMAGE,
+                    content_type='image/gif'
+                ),
+            )
+
+    def queries(self, url):
+        # Первый запрос создаёт миниатюры, второй считается без кэша.
+        self.client.get(url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        return len(context)
+
+    def test_listing_queries_do_not_grow_with_posts(self):
+        self.add_posts(2)
+        few = {url: self.queries(url) for url in self.urls}
+        self.add_posts(6)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.queries(url), few[url])
+                self.assertLessEqual(few[url], LISTING_QUERY_LIMIT)
+
+    def test_cards_use_excerpt_not_text(self):
+        Post.objects.create(
+            author=self.author, group=self.group,
+            text='Первый абзац <b>\n\nВторой ' + 'слово ' * 40,
+        )
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                post = response.context['page_obj'][0]
+                self.assertIn('text', post.get_deferred_fields())
+                self.assertContains(
+                    response,
+                    '<p>Первый абзац &lt;b&gt; Второй слово',
+                )
+                self.assertContains(response, 'слово …</p>')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Старый текст'
+        )
+        self.pages = {
+            reverse('posts:index'): 'posts/includes/cards/feed.html',
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}):
+                'posts/includes/cards/group.html',
+        }
+
+    def key(self, name):
+        return card_key(name, Post.objects.get(pk=self.post.pk), eager=True)
+
+    def test_page_assembled_from_cached_cards(self):
+        for url, name in self.pages.items():
+            with self.subTest(url=url):
+                self.client.get(url)
+                self.assertIn(self.key(name), cache)
+                cache.set(self.key(name), 'Карточка из кэша')
+        # Новое поколение: страницы собираются заново, карточки — нет.
+        caching.bump(*caching.post_scopes(self.post))
+        for url in self.pages:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Карточка из кэша')
+
+    def test_edit_invalidates_card_everywhere(self):
+        for url, name in self.pages.items():
+            self.client.get(url)
+            cache.set(self.key(name), 'Карточка из кэша')
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        for url in self.pages:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Новый текст')
+                self.assertNotContains(response, 'Карточка из кэша')
+
+    def test_rename_invalidates_card(self):
+        for url in self.pages:
+            self.client.get(url)
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Новое'
+        author.last_name = 'Имя'
+        author.save()
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'new-slug'
+        group.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новое Имя')
+        self.assertContains(
+            response, reverse('posts:group_list', kwargs={'slug': 'new-slug'})
+        )
+        self.assertNotContains(response, '/group/test-slug/')
+
+    @override_settings(BACKGROUND_EAGER=False)
+    def test_card_cached_once_picture_ready(self):
+        post = Post.objects.get(pk=self.post.pk)
+        post.image = SimpleUploadedFile(
+            name='small.gif', content=IMAGE, content_type='image/gif'
+        )
+        post.save()
+        name = self.pages[reverse('posts:index')]
+        self.client.get(reverse('posts:index'))
+        self.assertNotIn(self.key(name), cache)
+        build_variants(post.image.name)
+        caching.bump(*caching.post_scopes(post))
+        self.client.get(reverse('posts:index'))
+        self.assertIn(self.key(name), cache)
+
+    @override_settings(BACKGROUND_EAGER=False)
+    def test_missing_variants_do_not_generate_thumbnail(self):
+        post = Post.objects.get(pk=self.post.pk)
+        post.image = SimpleUploadedFile(
+            name='small.gif', content=IMAGE, content_type='image/gif'
+        )
+        post.save()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, f'src="{post.image.url}"')
+        self.assertFalse([
+            query for query in queries
+            if query['sql'].startswith('INSERT INTO "thumbnail_kvstore"')
+        ])
+
+
+class FeedIdsCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.posts = [
+            Post.objects.create(
+                author=self.author, group=self.group, text=f'Пост {i}'
+            )
+            for i in range(3)
+        ]
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+        )
+
+    def list_queries(self, url):
+        """Ответ и число запросов, которые выбирают страницу ленты."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        listing = [
+            query for query in context.captured_queries
+            if 'LIMIT 11' in query['sql']
+        ]
+        return response, len(listing)
+
+    def test_edit_keeps_id_lists(self):
+        for url in self.urls:
+            self.client.get(url)
+        post = Post.objects.get(pk=self.posts[0].pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response, listing = self.list_queries(url)
+                self.assertEqual(listing, 0)
+                self.assertContains(response, 'Исправленный пост')
+
+    def test_new_post_rebuilds_id_lists(self):
+        for url in self.urls:
+            self.client.get(url)
+        Post.objects.create(
+            author=self.author, group=self.group, text='Новый пост'
+        )
+        for url in self.urls:
+            with self.subTest(url=url):
+                response, listing = self.list_queries(url)
+                self.assertEqual(listing, 1)
+                self.assertContains(response, 'Новый пост')
+
+    def test_cached_cards_skip_database(self):
+        self.client.get(self.urls[0])
+        # Новое поколение разметки без изменения состава ленты.
+        caching.bump(*caching.post_scopes(self.posts[0]), lists=False)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.urls[0])
+        posts = [
+            query for query in context.captured_queries
+            if 'FROM "posts_post"' in query['sql']
+            and not query['sql'].endswith('LIMIT 1')
+        ]
+        self.assertEqual(posts, [])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        groups = [
+            Group.objects.create(
+                title=f'Группа {i}', slug=f'group-{i}', description='-'
+            )
+            for i in range(3)
+        ]
+        authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(3)
+        ]
+        for i in range(15):
+            post = Post.objects.create(
+                author=authors[i % 3],
+                group=groups[i % 3] if i % 2 else None,
+                text=f'Пост {i}',
+                image=SimpleUploadedFile(
+                    name=f'seed{i}.gif', content=IMAGE,
+                    content_type='image/gif'
+                ),
+            )
+            for author in authors:
+                Comment.objects.create(
+                    post=post, author=author, text='Комментарий'
+                )
+        for author in authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.author = authors[0]
+        cls.group = groups[1]
+        cls.post = post
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_posts_views_within_budget(self):
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_create'),
+        )
+        for url in pages:
+            for client in (self.guest_client, self.authorized_client):
+                for query in ('', '?page=2'):
+                    with self.subTest(url=url + query):
+                        cache.clear()
+                        assert_query_budget(client, url + query)
+
+    @override_settings(BACKGROUND_EAGER=False)
+    def test_post_create_within_budget(self):
+        author = Client()
+        author.force_login(self.author)
+        # Новая картинка дороже уже загруженной: для неё заводится Blob.
+        for image in (None, IMAGE, IMAGE + b'\x00'):
+            with self.subTest(image=image):
+                data = {'text': 'Новый пост', 'group': self.group.pk}
+                if image:
+                    data['image'] = SimpleUploadedFile(
+                        name='new.gif', content=image,
+                        content_type='image/gif'
+                    )
+                response = assert_query_budget(
+                    author, reverse('posts:post_create'), data
+                )
+                self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    @override_settings(BACKGROUND_EAGER=False)
+    def test_write_views_within_budget(self):
+        owner = Client()
+        owner.force_login(self.post.author)
+        edit = reverse('posts:post_edit', kwargs={'post_id': self.post.pk})
+        author = {'username': self.post.author.username}
+        requests = (
+            (owner, edit, None),
+            (owner, edit, {'text': 'Правка', 'group': self.group.pk}),
+            (owner, edit, {
+                'text': 'Правка', 'group': self.group.pk,
+                'image': SimpleUploadedFile(
+                    'edit.gif', IMAGE + b'\x01', 'image/gif'
+                ),
+            }),
+            (
+                self.authorized_client,
+                reverse('posts:add_comment', kwargs={
+                    'post_id': self.post.pk
+                }),
+                {'text': 'Комментарий'},
+            ),
+            (
+                self.authorized_client,
+                reverse('posts:profile_unfollow', kwargs=author), None,
+            ),
+            (
+                self.authorized_client,
+                reverse('posts:profile_follow', kwargs=author), None,
+            ),
+        )
+        for client, url, data in requests:
+            with self.subTest(url=url, data=data):
+                response = assert_query_budget(client, url, data)
+                self.assertIn(
+                    response.status_code, (HTTPStatus.OK, HTTPStatus.FOUND)
+                )
+
+    def test_follow_budget_grows_with_hot_authors(self):
+        for author in User.objects.filter(username__startswith='author'):
+            HotAuthor.objects.create(author=author)
+        assert_query_budget(
+            self.authorized_client, reverse('posts:follow_index')
+        )
+
+    @override_settings(DEBUG=True)
+    def test_debug_headers(self):
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(
+            int(response['X-Query-Count']),
+            response.wsgi_request.query_stats.count,
+        )
+        self.assertEqual(response['X-Query-Budget'], '6')
+        self.assertTrue(response['X-Query-Time'].endswith('ms'))
+        self.assertIn('X-Query-Duplicates', response)
+
+    def test_over_budget_logged(self):
+        url = reverse('posts:index')
+        with mock.patch.object(views.index, 'query_budget', 0):
+            with self.assertLogs('core.middleware', 'WARNING') as logs:
+                response = self.guest_client.get(url)
+        self.assertIn('posts:index', logs.output[0])
+        self.assertTrue(response.wsgi_request.query_stats.over_budget)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {i} про котов и <b>собак</b>'
+            )
+            for i in range(15)
+        ]
+        cls.other = Post.objects.create(author=cls.author, text='Про птиц')
+        Comment.objects.create(
+            post=cls.other, author=cls.author, text='Котики тоже птицы'
+        )
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, **params):
+        return self.guest_client.get(reverse('posts:search'), params)
+
+    def test_ranked_results_highlighted_and_escaped(self):
+        response = self.search(q='КОТ')
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
+        self.assertNotIn(self.other, page_obj)
+        self.assertContains(response, '<mark>котов</mark>')
+        self.assertContains(response, '&lt;b&gt;собак&lt;/b&gt;')
+        self.assertNotContains(response, '<b>собак</b>')
+
+    def test_cursor_pages_keep_query(self):
+        response = self.search(q='котов собак')
+        page_obj = response.context['page_obj']
+        self.assertContains(
+            response, f'in=posts&cursor={page_obj.next_cursor}'
+        )
+        second = self.search(
+            q='котов собак', cursor=page_obj.next_cursor
+        ).context['page_obj']
+        found = list(page_obj) + list(second)
+        self.assertCountEqual(found, self.posts)
+        self.assertIsNone(second.next_cursor)
+        previous = self.search(
+            q='котов собак', cursor=second.previous_cursor
+        ).context['page_obj']
+        self.assertEqual(list(previous), list(page_obj))
+
+    def test_comments_scope(self):
+        response = self.search(q='котик', **{'in': 'comments'})
+        self.assertEqual(
+            [hit.post_id for hit in response.context['page_obj']],
+            [self.other.pk],
+        )
+
+    def test_index_follows_edits_and_deletes(self):
+        post = self.posts[0]
+        post.text = 'Теперь про ежей'
+        post.save()
+        self.assertEqual(list(self.search(q='ежей').context['page_obj']),
+                         [post])
+        Post.objects.filter(pk=post.pk).delete()
+        self.assertEqual(len(self.search(q='ежей').context['page_obj']), 0)
+
+    def test_query_syntax_not_interpreted(self):
+        for query in ('"', 'кот AND', 'NEAR(кот', '*', 'кот -пёс'):
+            with self.subTest(query=query):
+                response = self.search(q=query)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIsNone(self.search(q='!!!').context['page_obj'])
+
+    def test_admin_search_uses_index(self):
+        client = Client()
+        client.force_login(self.admin)
+        url = reverse('admin:posts_post_changelist')
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, {'q': 'птиц'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.other])
+        sql = ' '.join(query['sql'] for query in context.captured_queries)
+        self.assertIn('posts_post_fts MATCH', sql)
+        self.assertNotIn('LIKE', sql)
+        response = client.get(
+            reverse('admin:posts_comment_changelist'), {'q': 'котики'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(3)
+        ]
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='-'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.authors[i % 3], group=cls.group, text=f'Пост {i}'
+            )
+            for i in range(12)
+        ]
+        for post in cls.posts:
+            Comment.objects.create(
+                post=post, author=cls.authors[0], text='Комментарий'
+            )
+        for author in cls.authors[1:]:
+            Follow.objects.create(user=cls.authors[0], author=author)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, **params):
+        return self.client.get(
+            reverse(f'admin:posts_{model}_changelist'), params
+        )
+
+    def test_queries_do_not_grow_with_rows(self):
+        for model in ('post', 'comment', 'follow'):
+            with self.subTest(model=model):
+                with CaptureQueriesContext(connection) as few:
+                    self.changelist(model)
+                for i in range(12, 24):
+                    post = Post.objects.create(
+                        author=self.authors[i % 3], group=self.group,
+                        text=f'Пост {i}',
+                    )
+                    Comment.objects.create(
+                        post=post, author=self.authors[1], text='Ещё'
+                    )
+                with CaptureQueriesContext(connection) as many:
+                    self.changelist(model)
+                self.assertEqual(len(many), len(few))
+
+    def test_input_filters(self):
+        post = self.posts[0]
+        response = self.changelist('comment', post_id=post.pk)
+        comments = response.context['cl'].result_list
+        self.assertEqual([comment.post_id for comment in comments], [post.pk])
+        response = self.changelist('post', author_id='author1')
+        self.assertEqual(response.context['cl'].result_count, 4)
+        response = self.changelist('follow', user_id='nobody')
+        self.assertEqual(response.context['cl'].result_count, 0)
+        response = self.changelist('comment', post_id='abc')
+        self.assertRedirects(
+            response, reverse('admin:posts_comment_changelist') + '?e=1',
+            fetch_redirect_response=False,
+        )
+
+    def test_counts_estimated_past_threshold(self):
+        with mock.patch('posts.paginator.ESTIMATE_THRESHOLD', 3):
+            cl = self.changelist('post').context['cl']
+            self.assertTrue(cl.paginator.estimated)
+            self.assertEqual(cl.result_count, self.posts[-1].pk)
+            cl = self.changelist('post', author_id='author1').context['cl']
+            self.assertEqual(cl.result_count, 3)
+        cl = self.changelist('post').context['cl']
+        self.assertFalse(cl.paginator.estimated)
+        self.assertEqual(cl.result_count, 12)
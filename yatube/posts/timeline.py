@@ -0,0 +1,115 @@
+from operator import attrgetter
+
+from .constants import FANOUT_LIMIT
+from .counters import followers_count
+from .models import Follow, HotAuthor, Post, Timeline
+from .objects import card_source
+from .paginator import KeysetSource
+
+BATCH_SIZE = 500
+
+
+def is_hot(author_id):
+    return HotAuthor.objects.filter(author_id=author_id).exists()
+
+
+def readers(author_id):
+    """id подписчиков, в чьи ленты раскладываются посты автора.
+
+    Посты популярных авторов не раскладываются: они подмешиваются
+    в ленту при чтении, см. follow_sources.
+    """
+    if is_hot(author_id):
+        return []
+    return list(Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True))
+
+
+def fan_out(post, user_ids=None):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    user_ids — уже прочитанный readers(post.author_id).
+    """
+    if user_ids is None:
+        user_ids = readers(post.author_id)
+    Timeline.objects.bulk_create(
+        [
+            Timeline(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in user_ids
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_ids, author_id):
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('id', 'pub_date')
+    Timeline.objects.bulk_create(
+        [
+            Timeline(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+            for user_id in user_ids
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def follow_added(follow):
+    if is_hot(follow.author_id):
+        return
+    if followers_count(follow.author_id) > FANOUT_LIMIT:
+        HotAuthor.objects.get_or_create(author_id=follow.author_id)
+        return
+    backfill([follow.user_id], follow.author_id)
+
+
+def follow_removed(follow):
+    Timeline.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id
+    ).delete()
+    if not is_hot(follow.author_id):
+        return
+    if followers_count(follow.author_id) > FANOUT_LIMIT:
+        return
+    # Автор перестал быть популярным: его посты снова раскладываются,
+    # поэтому ленты всех подписчиков дополняются пропущенными постами.
+    HotAuthor.objects.filter(author_id=follow.author_id).delete()
+    followers = Follow.objects.filter(
+        author_id=follow.author_id
+    ).values_list('user_id', flat=True)
+    backfill(list(followers), follow.author_id)
+
+
+def hot_authors(user):
+    """Популярные авторы среди подписок пользователя.
+
+    Список запоминается на объекте пользователя: в одном запросе его
+    читают и валидаторы условного GET, и сама view.
+    """
+    if not hasattr(user, '_hot_authors'):
+        user._hot_authors = list(Follow.objects.filter(
+            user=user, author__hot__isnull=False
+        ).values_list('author_id', flat=True))
+    return user._hot_authors
+
+
+def follow_sources(user, hot_author_ids):
+    """Источники ленты подписок: своя лента и посты популярных авторов.
+
+    Записи своей ленты дают только id постов: посты подставляет
+    paginate из кэша карточек.
+    """
+    sources = [KeysetSource(
+        Timeline.objects.filter(user=user).only('pub_date', 'post_id'),
+        id_field='post_id',
+        item=attrgetter('post_id'),
+    )]
+    for author_id in hot_author_ids:
+        sources.append(
+            card_source(Post.objects.filter(author_id=author_id))
+        )
+    return sources
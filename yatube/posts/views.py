@@ -1,62 +1,99 @@
-from django.shortcuts import get_object_or_404, render, redirect
-from django.core.paginator import Paginator
+from urllib.parse import urlencode
+
+from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 
+from core.querybudget import extend_budget, query_budget
 
-from .models import Group
 from .models import Post
-from .models import User
 from .models import Follow
+from .models import Comment
 from .forms import PostForm, CommentForm
-from .constants import CONST1
+from .caching import AUTHOR, GLOBAL, GROUP, follow_scopes, page_cache
+from .conditional import (
+    conditional, follow_state, group_state, index_state, post_state,
+    profile_state,
+)
+from . import objects
+from .constants import COMMENTS_PER_PAGE
+from .counters import stats_for
+from .paginator import paginate
+from .search import match_query, search_sources
+from .timeline import follow_sources, hot_authors
+
 
+def comment_listing(post_id):
+    return Comment.objects.filter(post_id=post_id).select_related('author')
 
+
+@query_budget(6)
+@conditional(index_state)
 def index(request):
-    posts = Post.objects.select_related('author', 'group').all()
-    paginator = Paginator(posts, CONST1)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    key, version, ids_version = page_cache(request, 'index', (GLOBAL, None))
+    page_obj = paginate(
+        request, objects.card_source(), key, ids_version,
+        objects=objects.cards,
+    )
     context = {
         'page_obj': page_obj,
+        'page_key': key,
+        'page_version': version,
     }
     return render(request, 'posts/index.html', context)
 
 
+@query_budget(8)
+@conditional(group_state)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author').all()
-    paginator = Paginator(posts, CONST1)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    group = objects.groups.get_or_404(slug)
+    key, version, ids_version = page_cache(
+        request, f'group:{group.pk}', (GROUP, group.pk)
+    )
+    page_obj = paginate(
+        request, objects.card_source(Post.objects.filter(group=group)),
+        key, ids_version, objects=objects.cards,
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
+        'page_key': key,
+        'page_version': version,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(10)
+@conditional(profile_state)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    profile = author.posts.all()
-    count = profile.count()
-    paginator = Paginator(profile, CONST1)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    user = request.user
-    following = user.is_authenticated and author.following.exists()
+    author = objects.users.get_or_404(username)
+    key, version, ids_version = page_cache(
+        request, f'profile:{author.pk}', (AUTHOR, author.pk)
+    )
+    stats = stats_for(author)
+    page_obj = paginate(
+        request, objects.card_source(Post.objects.filter(author=author)),
+        key, ids_version, objects=objects.cards,
+    )
     context = {
-        'count': count,
+        'count': stats.posts_count,
+        'stats': stats,
         'page_obj': page_obj,
+        'page_key': key,
+        'page_version': version,
         'author': author,
-        'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(10)
+@conditional(post_state)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    count = post.author.posts.count()
-    comments = post.comments.all()
+    post = objects.posts.get_or_404(post_id)
+    count = stats_for(post.author).posts_count
+    comments = paginate(
+        request, comment_listing(post.pk), per_page=COMMENTS_PER_PAGE
+    )
     form = CommentForm()
     context = {
         'post': post,
@@ -67,7 +104,41 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(6)
+@conditional(post_state)
+def post_comments(request, post_id):
+    """Следующая порция комментариев поста для «Показать ещё»."""
+    objects.posts.get_or_404(post_id)
+    comments = paginate(
+        request, comment_listing(post_id), per_page=COMMENTS_PER_PAGE
+    )
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+@query_budget(4)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    scope = 'comments' if request.GET.get('in') == 'comments' else 'posts'
+    match = match_query(query)
+    page_obj = None
+    if match is not None:
+        page_obj = paginate(request, search_sources(match, scope))
+    context = {
+        'query': query,
+        'scope': scope,
+        'page_obj': page_obj,
+        'query_string': urlencode({'q': query, 'in': scope}),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@query_budget(6, write=18)
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -84,9 +155,10 @@ def post_create(request):
     return render(request, 'posts/post_create.html', context)
 
 
+@query_budget(4, write=18)
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = objects.posts.get_or_404(post_id)
     is_edit = True
     form = PostForm(
         request.POST or None,
@@ -97,7 +169,9 @@ def post_edit(request, post_id):
         return redirect('posts:post_detail', post.pk)
     if form.is_valid():
         post = form.save(commit=False)
-        post.save()
+        # Пост мог прийти из кэша со старым счётчиком комментариев:
+        # пишутся только поля формы.
+        post.save(update_fields=[*form.fields, 'excerpt', 'updated'])
         return redirect('posts:post_detail', post.pk)
     context = {
         'post': post,
@@ -107,9 +181,11 @@ def post_edit(request, post_id):
     return render(request, 'posts/post_create.html', context)
 
 
+@query_budget(10)
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = objects.posts.get_or_404(post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -119,28 +195,45 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id)
 
 
+@query_budget(8)
 @login_required
+@conditional(follow_state)
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, CONST1)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    hot_author_ids = hot_authors(request.user)
+    # Посты каждого популярного автора читаются отдельно: для проверки
+    # свежести ленты и для страницы.
+    extend_budget(request, 2 * len(hot_author_ids))
+    key, version, ids_version = page_cache(
+        request,
+        f'follow:{request.user.pk}',
+        *follow_scopes(request.user, hot_author_ids)
+    )
+    page_obj = paginate(
+        request, follow_sources(request.user, hot_author_ids), key,
+        ids_version, objects=objects.cards,
+    )
     context = {
         'page_obj': page_obj,
+        'page_key': key,
+        'page_version': version,
     }
     return render(request, 'posts/follow.html', context)
 
 
+@query_budget(15)
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = objects.users.get_or_404(username)
     user = request.user
     if author != user:
         Follow.objects.get_or_create(user=user, author=author)
     return redirect('posts:profile', username=username)
 
 
+@query_budget(10)
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     user = request.user
     Follow.objects.filter(user=user, author__username=username).delete()
@@ -50,12 +50,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.PageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -137,7 +139,10 @@ STATIC_URL = '/static/'
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма уходят фоновой задачей; отправляет их EMAIL_DELIVERY_BACKEND.
+EMAIL_BACKEND = 'core.mail.EmailBackend'
+
+EMAIL_DELIVERY_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
@@ -148,6 +153,24 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
     }
 }
+
+THUMBNAIL_KVSTORE = 'core.thumbnails.KVStore'
+
+# Фоновые задачи, см. core.background. С BACKGROUND_QUEUE они пишутся в
+# очередь в базе и выполняются manage.py runworker, без неё — потоками
+# процесса веб-сервера.
+BACKGROUND_QUEUE = True
+BACKGROUND_WORKERS = 2
+# Выполнять задачи сразу, в том же потоке. Тесты включают это через
+# core.testing.testing_settings.
+BACKGROUND_EAGER = False
+
+TEST_RUNNER = 'core.testing.TestRunner'